@@ -0,0 +1,311 @@
+import hashlib
+import io
+import json
+import re
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def make_jar(name, version, size=0):
+    # A valid plugin jar, padded with incompressible data up to roughly size bytes
+    jarFile = io.BytesIO()
+    with zipfile.ZipFile(jarFile, "w") as jar:
+        jar.writestr("plugin.yml", f"name: {name}\nversion: '{version}'\nmain: a.B\n")
+        if size:
+            jar.writestr(
+                "padding.bin",
+                hashlib.shake_256(name.encode()).digest(size),
+                zipfile.ZIP_STORED,
+            )
+    return jarFile.getvalue()
+
+
+class MockState:
+    """Configuration and counters of a mock server."""
+
+    def __init__(self, latency=0.0, bandwidth=0, jarSize=0):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.jarSize = jarSize
+        self.lock = threading.Lock()
+        self.jars = {}
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.bytesSent = 0
+        self.paths = {}
+
+    def count(self, path, size):
+        with self.lock:
+            self.requests += 1
+            self.bytesSent += size
+            key = re.sub(r"\d+", "N", path.split("?")[0])
+            self.paths[key] = self.paths.get(key, 0) + 1
+
+    def get_jar(self, name, version):
+        with self.lock:
+            if (name, version) not in self.jars:
+                self.jars[(name, version)] = make_jar(name, version, self.jarSize)
+            return self.jars[(name, version)]
+
+
+def latest_version(name):
+    return f"2.0.{sum(name.encode()) % 10}"
+
+
+def github_release(baseUrl, name, tag, prerelease, jar):
+    return {
+        "tag_name": f"v{tag}",
+        "prerelease": prerelease,
+        "created_at": "2022-06-01T00:00:00Z" if prerelease else "2022-05-01T00:00:00Z",
+        "body": "Changelog " * 200,
+        "assets": [
+            {
+                "browser_download_url": f"{baseUrl}/files/{name}/{tag}/{name}-{tag}.jar",
+                "digest": f"sha256:{hashlib.sha256(jar).hexdigest()}",
+            }
+        ],
+    }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Serves Spiget, GitHub, Jenkins and jar downloads for synthetic plugins.
+
+    Plugin names are taken from the URL, so any plugins.json made by the benchmark is
+    served without setup. Every plugin's latest version is newer than 1.0.0.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def baseUrl(self):
+        return f"http://{self.headers['Host']}"
+
+    def send_body(self, body, contentType="application/json"):
+        state = self.server.state
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            state.count(self.path, 0)
+            return
+
+        # Resumed downloads only get the rest of the body
+        match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if match and self.headers.get("If-Range", etag) == etag:
+            start = int(match[1])
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}"
+            )
+            body = body[start:]
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+
+        # Throttle to the configured bandwidth (bytes per second)
+        if self.command == "HEAD":
+            body = b""
+        elif state.bandwidth:
+            for i in range(0, len(body), 16384):
+                chunk = body[i : i + 16384]
+                self.wfile.write(chunk)
+                time.sleep(len(chunk) / state.bandwidth)
+        else:
+            self.wfile.write(body)
+        state.count(self.path, len(body))
+
+    def send_json(self, data):
+        self.send_body(json.dumps(data).encode())
+
+    def send_not_found(self):
+        self.send_response(404)
+        body = json.dumps({"message": "Not Found", "error": "Not found"}).encode()
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.state.count(self.path, len(body))
+
+    def do_GET(self):
+        time.sleep(self.server.state.latency)
+
+        url = urlparse(self.path)
+        path = url.path
+        query = parse_qs(url.query)
+
+        for pattern, handler in (
+            (r"/spiget/resources/(\d+)", self.spiget_resource),
+            (r"/spiget/resources/(\d+)/versions/latest", self.spiget_version),
+            (r"/spiget/resources/(\d+)/download", self.spiget_download),
+            (r"/github/repos/([^/]+)/([^/]+)/releases", self.github_releases),
+            (r"/github/repos/([^/]+)/([^/]+)/releases/latest", self.github_latest),
+            (r"/github/repos/([^/]+)/([^/]+)/actions/artifacts", self.github_artifacts),
+            (r"/jenkins/job/([^/]+)/api/json", self.jenkins_job),
+            (r"/jenkins/job/([^/]+)/(\w+)/api/json", self.jenkins_build),
+            (r"/jenkins/job/([^/]+)/(?:\w+)/artifact/.*", self.jenkins_artifact),
+            (r"/files/([^/]+)/([^/]+)/.*", self.file),
+        ):
+            match = re.fullmatch(pattern, path)
+            if match:
+                return handler(*match.groups(), query=query)
+        self.send_not_found()
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_POST(self):
+        time.sleep(self.server.state.latency)
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+        if urlparse(self.path).path != "/github/graphql":
+            return self.send_not_found()
+
+        # Answer every aliased repository(owner, name) in the query
+        data = {}
+        for alias, owner, name in re.findall(
+            r'(\w+): repository\(owner: "([^"]*)", name: "([^"]*)"\)', body["query"]
+        ):
+            version = latest_version(name)
+            release = {
+                "tagName": f"v{version}",
+                "isPrerelease": False,
+                "createdAt": "2022-05-01T00:00:00Z",
+                "releaseAssets": {
+                    "nodes": [
+                        {
+                            "downloadUrl": f"{self.baseUrl}/files/{name}/{version}"
+                            f"/{name}-{version}.jar"
+                        }
+                    ]
+                },
+            }
+            data[alias] = {"latestRelease": release, "releases": {"nodes": [release]}}
+
+        self.send_json({"data": data})
+
+    # Spiget: resource IDs map to plugin names Plugin<ID>
+    def spiget_resource(self, spigotId, query):
+        self.send_json(
+            {
+                "id": int(spigotId),
+                "testedVersions": ["1.18", "1.19"],
+                "file": {"type": ".jar"},
+                "description": "Description " * 500,
+            }
+        )
+
+    def spiget_version(self, spigotId, query):
+        self.send_json({"name": latest_version(f"Plugin{spigotId}")})
+
+    def spiget_download(self, spigotId, query):
+        name = f"Plugin{spigotId}"
+        self.send_body(self.server.state.get_jar(name, latest_version(name)))
+
+    # GitHub: repositories are named owner/<plugin name>
+    def github_releases(self, owner, name, query):
+        version = latest_version(name)
+        perPage = int(query.get("per_page", ["30"])[0])
+        tags = [f"{version}-beta"] + [
+            f"{version[:-1]}{i}" for i in range(int(version[-1]), -1, -1)
+        ]
+        releases = [
+            github_release(
+                self.baseUrl, name, tag, not i, self.server.state.get_jar(name, tag)
+            )
+            for i, tag in enumerate(tags)
+        ]
+        releases = releases[:1] + releases[1:] * 10
+        self.send_json(releases[:perPage])
+
+    def github_latest(self, owner, name, query):
+        version = latest_version(name)
+        self.send_json(
+            github_release(
+                self.baseUrl,
+                name,
+                version,
+                False,
+                self.server.state.get_jar(name, version),
+            )
+        )
+
+    def github_artifacts(self, owner, name, query):
+        self.send_json({"total_count": 0, "artifacts": []})
+
+    # Jenkins: jobs are named after their plugin
+    def jenkins_build_info(self, name, build):
+        version = latest_version(name)
+        return {
+            "number": int(version.rsplit(".", 1)[1]) + (build == "lastSuccessfulBuild"),
+            "result": "SUCCESS",
+            "artifacts": [{"relativePath": f"target/{name}-{version}.jar"}],
+            "fingerprint": [
+                {
+                    "fileName": f"{name}-{version}.jar",
+                    "hash": hashlib.md5(
+                        self.server.state.get_jar(name, version)
+                    ).hexdigest(),
+                }
+            ],
+            "changeSet": {"items": [{"msg": "Commit " * 50}] * 20},
+        }
+
+    def jenkins_job(self, name, query):
+        # Fields of builds that aren't in ?tree= are left out, roughly like Jenkins
+        tree = query.get("tree", [None])[0]
+        builds = {}
+        for build in ("lastStableBuild", "lastSuccessfulBuild"):
+            buildInfo = self.jenkins_build_info(name, build)
+            builds[build] = {
+                field: value
+                for field, value in buildInfo.items()
+                if not tree or field in tree
+            }
+        self.send_json(builds)
+
+    def jenkins_build(self, name, build, query):
+        self.send_json(self.jenkins_build_info(name, build))
+
+    def jenkins_artifact(self, name, query):
+        self.send_body(self.server.state.get_jar(name, latest_version(name)))
+
+    def file(self, name, version, query):
+        self.send_body(self.server.state.get_jar(name, version))
+
+
+def start_server(latency=0.0, bandwidth=0, jarSize=0, port=0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockHandler)
+    server.daemon_threads = True
+    server.state = MockState(latency, bandwidth, jarSize)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+
+    argParser = argparse.ArgumentParser(
+        description="Serve mock Spiget, GitHub and Jenkins APIs."
+    )
+    argParser.add_argument("--port", type=int, default=8080)
+    argParser.add_argument("--latency", type=float, default=0.0)
+    argParser.add_argument("--bandwidth", type=int, default=0)
+    argParser.add_argument("--jar-size", type=int, default=0)
+    args = argParser.parse_args()
+
+    server = start_server(args.latency, args.bandwidth, args.jar_size, args.port)
+    print(f"Serving on http://127.0.0.1:{server.server_port}")
+    threading.Event().wait()
@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_server import make_jar, start_server
+
+repoPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sources = ("spigot", "github", "jenkins", "directUrls")
+
+
+def make_plugin_entry(baseUrl, i):
+    name = f"Plugin{i}"
+
+    match sources[i % len(sources)]:
+        case "spigot":
+            return {"name": name, "spigotId": i}
+        case "github":
+            return {"name": name, "githubRepo": f"owner/{name}"}
+        case "jenkins":
+            return {"name": name, "jenkinsServer": f"{baseUrl}/jenkins/job/{name}"}
+        case "directUrls":
+            return {
+                "name": name,
+                "stableDirectUrl": f"{baseUrl}/files/{name}/2.0.0/{name}.jar",
+            }
+
+
+def make_server_path(path, baseUrl, count, settings):
+    # A plugins path with count outdated plugins, their plugins.json and settings.toml
+    os.makedirs(f"{path}/plugins")
+
+    for i in range(count):
+        with open(f"{path}/plugins/Plugin{i}.jar", "wb") as f:
+            f.write(make_jar(f"Plugin{i}", "1.0.0"))
+
+    with open(f"{path}/plugins.json", "w") as f:
+        json.dump(
+            {
+                "$schema": "https://github.com/shifterest/plugwatch/raw/main/schema.json",
+                "plugins": [make_plugin_entry(baseUrl, i) for i in range(count)],
+            },
+            f,
+            indent=4,
+        )
+
+    with open(f"{path}/settings.toml", "w") as f:
+        f.write(f'spigetApiUrl = "{baseUrl}/spiget"\n')
+        f.write(f'githubApiUrl = "{baseUrl}/github"\n')
+        for key, value in settings.items():
+            f.write(f"{key} = {json.dumps(value)}\n")
+
+
+def run_plugwatch(path, *args):
+    # Returns the wall time and peak memory (in kilobytes) of one plugwatch run
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, f"{repoPath}/plugwatch.py", *args],
+        cwd=path,
+        stdout=subprocess.DEVNULL,
+    )
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+
+    if status:
+        print(f"❗ plugwatch exited with status {status}")
+
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    peakMemory = (
+        usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    )
+    return elapsed, peakMemory
+
+
+def run_benchmark(server, count, runs, settings):
+    results = []
+    path = tempfile.mkdtemp(prefix="plugwatch-bench-")
+
+    try:
+        make_server_path(
+            path, f"http://127.0.0.1:{server.server_port}", count, settings
+        )
+
+        # Later runs show the effect of plugwatch's caches
+        for run in range(runs):
+            server.state.reset()
+            elapsed, peakMemory = run_plugwatch(path)
+            results.append(
+                {
+                    "plugins": count,
+                    "run": run + 1,
+                    "time": elapsed,
+                    "requests": server.state.requests,
+                    "bytes": server.state.bytesSent,
+                    "peakMemory": peakMemory,
+                    "paths": server.state.paths,
+                }
+            )
+    finally:
+        shutil.rmtree(path)
+
+    return results
+
+
+def print_results(results):
+    print(
+        f"{'plugins':>8} {'run':>4} {'time':>9} {'requests':>9} {'bytes':>12}"
+        f" {'peak memory':>12}"
+    )
+    for result in results:
+        print(
+            f"{result['plugins']:>8} {result['run']:>4} {result['time']:>8.2f}s"
+            f" {result['requests']:>9} {result['bytes']:>12}"
+            f" {result['peakMemory']:>9} KB"
+        )
+
+
+if __name__ == "__main__":
+    argParser = argparse.ArgumentParser(
+        description="Benchmark plugwatch against mock Spiget, GitHub and Jenkins APIs."
+    )
+    argParser.add_argument(
+        "--plugins", type=int, nargs="+", default=[10, 100, 1000], metavar="N"
+    )
+    argParser.add_argument("--runs", type=int, default=2, help="runs per plugin count")
+    argParser.add_argument(
+        "--latency", type=float, default=0.05, help="seconds per request"
+    )
+    argParser.add_argument(
+        "--bandwidth", type=int, default=0, help="bytes per second per response"
+    )
+    argParser.add_argument("--jar-size", type=int, default=0, help="bytes per jar")
+    argParser.add_argument(
+        "--set",
+        nargs=2,
+        action="append",
+        default=[],
+        metavar=("KEY", "VALUE"),
+        help="settings.toml value as JSON, e.g. --set workers 8",
+    )
+    argParser.add_argument("--json", metavar="PATH", help="write results to a file")
+    args = argParser.parse_args()
+
+    settings = {"autoDownloads": True}
+    settings.update((key, json.loads(value)) for key, value in args.set)
+
+    server = start_server(args.latency, args.bandwidth, args.jar_size)
+    results = []
+    for count in args.plugins:
+        results += run_benchmark(server, count, args.runs, settings)
+        print_results(results[-args.runs :])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": settings, "results": results}, f, indent=4)
@@ -0,0 +1,91 @@
+import argparse
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_server import start_server
+from run import make_server_path, repoPath
+
+# Heavy modules that should only be imported when they're needed
+heavyModules = ("dynaconf", "requests", "dateutil", "http.server", "ctypes")
+
+
+def time_plugwatch(path, args, runs):
+    # Wall times of runs of plugwatch with args, after one warm-up run
+    times = []
+    for run in range(runs + 1):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, f"{repoPath}/plugwatch.py", *args],
+            cwd=path,
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+        if run:
+            times.append(time.perf_counter() - start)
+    return times
+
+
+def get_imported_modules(path, args):
+    # Heavy modules imported by a run of plugwatch with args
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", f"{repoPath}/plugwatch.py", *args],
+        cwd=path,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    modules = {line.rsplit("|", 1)[-1].strip() for line in process.stderr.splitlines()}
+    return [module for module in heavyModules if module in modules]
+
+
+if __name__ == "__main__":
+    argParser = argparse.ArgumentParser(
+        description="Benchmark how long plugwatch takes to start and check one plugin."
+    )
+    argParser.add_argument("--runs", type=int, default=10, help="runs per scenario")
+    argParser.add_argument("--json", metavar="PATH", help="write results to a file")
+    args = argParser.parse_args()
+
+    server = start_server()
+    path = tempfile.mkdtemp(prefix="plugwatch-startup-")
+    scenarios = {
+        "help": ["--help"],
+        "rebuild index": ["--rebuild-index"],
+        "one Jenkins plugin": ["Plugin2"],
+        "one GitHub plugin": ["Plugin1"],
+        "all plugins": [],
+    }
+    results = []
+
+    try:
+        make_server_path(
+            path, f"http://127.0.0.1:{server.server_port}", 8, {"autoDownloads": True}
+        )
+
+        print(f"{'scenario':<20} {'median':>8} {'min':>8}  heavy imports")
+        for name, scenarioArgs in scenarios.items():
+            times = time_plugwatch(path, scenarioArgs, args.runs)
+            modules = get_imported_modules(path, scenarioArgs)
+            results.append(
+                {
+                    "scenario": name,
+                    "median": statistics.median(times),
+                    "min": min(times),
+                    "modules": modules,
+                }
+            )
+            print(
+                f"{name:<20} {statistics.median(times):>7.3f}s {min(times):>7.3f}s "
+                f" {', '.join(modules) or '-'}"
+            )
+    finally:
+        shutil.rmtree(path)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
@@ -1,24 +1,67 @@
+import argparse
 import os
 import sys
 
-from src.config import settings
-from src.info import generate_plugins_json
-from src.process import process_all_plugins, process_plugin
+from src.config import get_plugins_paths, settings
+from src.events import set_output
+from src.info import generate_plugins_json, rebuild_jar_index
+from src.install import recover_installs, roll_back_last
+from src.metrics import print_profile, write_profile
+from src.process import process_all_plugins, process_plugins
 
 pluginVersion = "0.1-alpha"
 
+argParser = argparse.ArgumentParser(description="A mediocre plugin updater.")
+argParser.add_argument("names", nargs="*", help="process only these plugins")
+argParser.add_argument(
+    "-g",
+    "--generate",
+    action="store_true",
+    help="generate missing plugins.json entries",
+)
+argParser.add_argument(
+    "--rebuild-index", action="store_true", help="rebuild the jar index"
+)
+argParser.add_argument(
+    "--rollback", action="store_true", help="undo the last plugin updates"
+)
+argParser.add_argument(
+    "--daemon", action="store_true", help="keep running and check plugins on a schedule"
+)
+argParser.add_argument(
+    "--output",
+    choices=("human", "ndjson"),
+    default="human",
+    help="with ndjson, write one JSON event per line to stdout (and the rest to stderr)",
+)
+argParser.add_argument(
+    "--profile", action="store_true", help="print where the run's time went"
+)
+argParser.add_argument(
+    "--profile-json", metavar="PATH", help="write the run's timings to a JSON file"
+)
+args = argParser.parse_args()
+set_output(args.output)
+
 print(f"\n🔌 plugwatch {pluginVersion}")
 print("------------------------------------------")
 
-# Make a plugins folder if it doesn't exist
-if not os.path.exists(settings.pluginsPath):
-    os.mkdir(settings.pluginsPath)
+# Make plugins folders if they don't exist
+for pluginsPath in get_plugins_paths():
+    if not os.path.exists(pluginsPath):
+        os.mkdir(pluginsPath)
+
+# Undo updates that were cut off halfway
+recover_installs(get_plugins_paths())
 
 # Check if plugins.json exists
 if not os.path.exists("plugins.json"):
     print("\n⚙️ plugins.json does not exist!")
 
-    print(f"   💡 Generating from your plugins path ({settings.pluginsPath})...")
+    print(
+        "   💡 Generating from your plugins path"
+        f" ({', '.join(get_plugins_paths())})..."
+    )
     if not generate_plugins_json():
         print(
             f"\n❕ I couldn't find any plugins, so plugins.json won't contain any entries."
@@ -35,15 +78,46 @@ else:
     print("🟢 Auto-downloads are enabled!\n")
 
 # Bring the action
-if len(sys.argv) >= 2:
-    if sys.argv[1] == "--generate" or sys.argv[1] == "-g":
-        print("💡 Generating missing plugins.json entries...")
-        generate_plugins_json(True)
-        print("\n✅ Done!\n")
-        sys.exit()
+if args.generate:
+    print("💡 Generating missing plugins.json entries...")
+    generate_plugins_json(True)
+    print("\n✅ Done!\n")
+    sys.exit()
+elif args.rebuild_index:
+    print("💡 Rebuilding the jar index...")
+    print(f"   📋 Indexed {len(rebuild_jar_index())} plugin(s)")
+    print("\n✅ Done!\n")
+    sys.exit()
+elif args.rollback:
+    print("💡 Rolling back the last plugin updates...")
+    journal = roll_back_last()
+    if not journal:
+        print("   ❕ Nothing to roll back")
     else:
-        process_plugin(sys.argv[1])
+        for operation in journal["operations"]:
+            for backup in operation["backups"]:
+                print(f"   ♻️ Restored {os.path.relpath(backup['path'])}")
+            if operation["path"] not in [b["path"] for b in operation["backups"]]:
+                print(f"   🗑️ Removed {os.path.relpath(operation['path'])}")
+    print("\n✅ Done!\n")
+    sys.exit()
+elif args.daemon:
+    from src.daemon import run_daemon
+
+    try:
+        run_daemon()
+    except KeyboardInterrupt:
+        print("\n✅ Stopped watching plugs.\n")
+        sys.exit()
+elif args.names:
+    process_plugins(args.names)
 else:
     process_all_plugins()
 
 print("\n✅ All plugs have been watched! Whatever that means.\n")
+
+if args.profile:
+    print_profile()
+    print()
+if args.profile_json:
+    write_profile(args.profile_json)
@@ -0,0 +1,314 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from src.config import settings
+
+httpCacheLock = threading.Lock()
+httpCacheSize = None
+
+
+def get_cache_path(*parts):
+    path = os.path.join(settings.cachePath, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def write_json_atomic(path, data):
+    # Write to a temporary file first so readers never see a partial file
+    tempPath = f"{path}.{threading.get_ident()}.temp"
+    with open(tempPath, "w") as f:
+        json.dump(data, f)
+    os.replace(tempPath, path)
+
+
+def write_text_atomic(path, text):
+    tempPath = f"{path}.{threading.get_ident()}.temp"
+    with open(tempPath, "w") as f:
+        f.write(text)
+    os.replace(tempPath, path)
+
+
+def get_http_cache_path(url):
+    return get_cache_path("http", hashlib.sha1(url.encode()).hexdigest() + ".json")
+
+
+def load_cached_response(url):
+    path = get_http_cache_path(url)
+
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    # Entries past their TTL are refetched in full
+    if entry.get("url") != url or time.time() - entry["time"] > settings.httpCacheTtl:
+        return None
+
+    # Mark as recently used for eviction
+    os.utime(path)
+    return entry
+
+
+def store_cached_response(url, response):
+    global httpCacheSize
+
+    if not (response.headers.get("ETag") or response.headers.get("Last-Modified")):
+        return
+
+    path = get_http_cache_path(url)
+    entry = {
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        "lastModified": response.headers.get("Last-Modified"),
+        "time": time.time(),
+        "body": response.text,
+    }
+
+    with httpCacheLock:
+        if httpCacheSize is None:
+            httpCacheSize = sum(
+                entry.stat().st_size for entry in os.scandir(os.path.dirname(path))
+            )
+        elif os.path.exists(path):
+            httpCacheSize -= os.path.getsize(path)
+
+        write_json_atomic(path, entry)
+        httpCacheSize += os.path.getsize(path)
+
+        httpCacheSize = evict_least_recently_used(
+            os.path.dirname(path), httpCacheSize, settings.httpCacheSize
+        )
+
+
+def evict_least_recently_used(directory, size, maxSize):
+    # Remove least recently used files until the directory is below 90% of maxSize
+    # (in megabytes), returning its new size
+    if size <= maxSize * 1024 * 1024:
+        return size
+
+    entries = sorted(os.scandir(directory), key=lambda entry: entry.stat().st_mtime)
+    for entry in entries:
+        if size <= maxSize * 1024 * 1024 * 0.9:
+            break
+        size -= entry.stat().st_size
+        os.remove(entry.path)
+
+    return size
+
+
+def refresh_cached_response(entry):
+    # Restart the TTL of an entry after the server confirmed it (HTTP 304)
+    entry["time"] = time.time()
+
+    with httpCacheLock:
+        write_json_atomic(get_http_cache_path(entry["url"]), entry)
+
+
+jarIndex = None
+jarIndexLock = threading.Lock()
+jarIndexChanged = False
+
+
+def load_jar_index():
+    global jarIndex
+
+    if jarIndex is None:
+        try:
+            with open(get_cache_path("jars.json")) as f:
+                jarIndex = json.load(f)
+        except (OSError, ValueError):
+            jarIndex = {}
+
+    return jarIndex
+
+
+def get_jar_key(jarPath):
+    stat = os.stat(jarPath)
+    return [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+
+
+def get_indexed_jar(jarPath):
+    # Only return metadata if the jar hasn't changed since it was indexed
+    with jarIndexLock:
+        entry = load_jar_index().get(os.path.abspath(jarPath))
+
+    if entry and entry["key"] == get_jar_key(jarPath):
+        return entry["info"]
+    return None
+
+
+def index_jar(jarPath, info):
+    global jarIndexChanged
+
+    entry = {"key": get_jar_key(jarPath), "info": info}
+    with jarIndexLock:
+        load_jar_index()[os.path.abspath(jarPath)] = entry
+        jarIndexChanged = True
+
+
+def invalidate_jars(*jarPaths):
+    global jarIndexChanged
+
+    with jarIndexLock:
+        for jarPath in jarPaths:
+            if load_jar_index().pop(os.path.abspath(jarPath), None):
+                jarIndexChanged = True
+
+
+def clear_jar_index():
+    global jarIndex, jarIndexChanged
+
+    with jarIndexLock:
+        jarIndex = {}
+        jarIndexChanged = True
+
+
+def save_jar_index():
+    global jarIndexChanged
+
+    with jarIndexLock:
+        if jarIndexChanged:
+            # Drop entries of jars that no longer exist
+            for jarPath in [path for path in jarIndex if not os.path.exists(path)]:
+                del jarIndex[jarPath]
+
+            write_json_atomic(get_cache_path("jars.json"), jarIndex)
+            jarIndexChanged = False
+
+
+def load_generated_jars():
+    # Jars plugins.json entries were last generated from, by path
+    try:
+        with open(get_cache_path("generated.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_generated_jars(jars):
+    write_json_atomic(get_cache_path("generated.json"), jars)
+
+
+downloadRecords = None
+downloadRecordsLock = threading.Lock()
+storeSize = None
+
+
+def load_download_records():
+    global downloadRecords
+
+    if downloadRecords is None:
+        try:
+            with open(get_cache_path("downloads.json")) as f:
+                downloadRecords = json.load(f)
+        except (OSError, ValueError):
+            downloadRecords = {}
+
+    return downloadRecords
+
+
+def get_download_record(key):
+    with downloadRecordsLock:
+        return load_download_records().get(key)
+
+
+def get_store_path(sha256):
+    return get_cache_path("store", f"{sha256}.jar")
+
+
+def is_stored(record):
+    return bool(record) and os.path.exists(get_store_path(record["sha256"]))
+
+
+def is_installed(record, pluginsPath, jarPath=None):
+    # Whether the jar installed in pluginsPath is this download, untouched
+    installed = (record or {}).get("installed", {}).get(os.path.abspath(pluginsPath))
+    if not installed or installed["sha256"] != record["sha256"]:
+        return False
+    if jarPath and os.path.abspath(jarPath) != installed["path"]:
+        return False
+
+    try:
+        return get_jar_key(installed["path"]) == installed["key"]
+    except OSError:
+        return False
+
+
+def record_download(key, response, sha256, tempPath, build=None, filename=None):
+    # Moves a finished download into the store and remembers where it came from
+    global storeSize
+
+    record = {
+        "etag": response.headers.get("ETag"),
+        "lastModified": response.headers.get("Last-Modified"),
+        "contentLength": response.headers.get("Content-Length"),
+        "sha256": sha256,
+        "build": build,
+        "filename": filename,
+        "installed": {},
+    }
+
+    with downloadRecordsLock:
+        previousRecord = load_download_records().get(key, {})
+
+        # A 304 response doesn't necessarily repeat the validators
+        if response.status_code == 304:
+            for field in ("etag", "lastModified", "contentLength"):
+                record[field] = record[field] or previousRecord.get(field)
+        if "path" not in previousRecord.get("installed", {}):
+            record["installed"] = previousRecord.get("installed", {})
+
+        downloadRecords[key] = record
+        write_json_atomic(get_cache_path("downloads.json"), downloadRecords)
+
+        storePath = get_store_path(sha256)
+        if storeSize is None:
+            storeSize = sum(
+                entry.stat().st_size for entry in os.scandir(os.path.dirname(storePath))
+            )
+        if tempPath and not os.path.exists(storePath):
+            os.replace(tempPath, storePath)
+            storeSize += os.path.getsize(storePath)
+        elif tempPath:
+            os.remove(tempPath)
+
+        # Jars in the store share their data (and modification time) with installed
+        # jars, so they are evicted oldest first rather than least recently used
+        storeSize = evict_least_recently_used(
+            os.path.dirname(storePath), storeSize, settings.storeSize
+        )
+
+    return record
+
+
+def record_install(key, pluginsPath, path):
+    with downloadRecordsLock:
+        record = load_download_records()[key]
+        record["installed"][os.path.abspath(pluginsPath)] = {
+            "path": os.path.abspath(path),
+            "key": get_jar_key(path),
+            "sha256": record["sha256"],
+        }
+        write_json_atomic(get_cache_path("downloads.json"), downloadRecords)
+
+
+def restore_from_store(sha256, tempPath):
+    # Link (or copy) a downloaded jar from the store into a plugins path
+    storePath = get_store_path(sha256)
+
+    with downloadRecordsLock:
+        if not os.path.exists(storePath):
+            return False
+
+        os.remove(tempPath)
+        try:
+            os.link(storePath, tempPath)
+        except OSError:
+            shutil.copyfile(storePath, tempPath)
+
+    return True
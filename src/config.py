@@ -1,34 +1,118 @@
-from dynaconf import Dynaconf, Validator
-
-settings = Dynaconf(
-    envvar_prefix="DYNACONF",
-    settings_files=["settings.toml", ".secrets.toml"],
-    validators=[
-        Validator(
-            "userAgent",
-            default=(
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML,"
-                " like Gecko) Chrome/102.0.0.0 Safari/537.36"
+import threading
+
+
+class Settings:
+    """Settings from settings.toml, .secrets.toml and the environment."""
+
+    # dynaconf is only imported (and its validators run) on first use. Settings are
+    # then read from a plain dict.
+
+    def __init__(self):
+        self.values = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            if self.values is None:
+                self.values = load_settings()
+        return self.values
+
+    def __getattr__(self, name):
+        try:
+            return (self.values or self.load())[name.lower()]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def get(self, name, default=None):
+        return (self.values or self.load()).get(name.lower(), default)
+
+
+def load_settings():
+    from dynaconf import Dynaconf, Validator
+
+    dynaconfSettings = Dynaconf(
+        envvar_prefix="DYNACONF",
+        settings_files=["settings.toml", ".secrets.toml"],
+        validators=[
+            Validator(
+                "userAgent",
+                default=(
+                    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML,"
+                    " like Gecko) Chrome/102.0.0.0 Safari/537.36"
+                ),
+            ),
+            Validator(
+                "precedence",
+                default=[
+                    "directUrls",
+                    "github",
+                    "jenkins",
+                    "spigot",
+                    "bukkit",
+                ],
             ),
-        ),
-        Validator(
-            "precedence",
-            default=[
-                "directUrls",
-                "github",
-                "jenkins",
-                "spigot",
-                "bukkit",
-            ],
-        ),
-        Validator("pluginsPath", default="plugins"),
-        Validator("autoDownloads", default=False),
-        Validator("forceDownloads", default=False),
-        Validator("preferStable", default=True),
-        Validator("preferActions", default=False),
-        Validator("delay", default=0),
-    ],
-)
-
-# `envvar_prefix` = export envvars with `export DYNACONF_FOO=bar`.
-# `settings_files` = Load these files in the order.
+            Validator("spigetApiUrl", default="https://api.spiget.org/v2"),
+            Validator("githubApiUrl", default="https://api.github.com"),
+            Validator("bukkitUrl", default="https://dev.bukkit.org"),
+            Validator("pluginsPath", default="plugins"),
+            Validator("autoDownloads", default=False),
+            Validator("forceDownloads", default=False),
+            Validator("preferStable", default=True),
+            Validator("preferActions", default=False),
+            Validator("delay", default=0),
+            Validator("workers", default=1),
+            Validator("downloadWorkers", default=2),
+            Validator("hostConnections", default=2),
+            Validator("downloadBandwidth", default=0),
+            Validator("minFreeSpace", default=100),
+            Validator("connectTimeout", default=10),
+            Validator("readTimeout", default=30),
+            Validator("requestRetries", default=2),
+            Validator("requestDeadline", default=120),
+            Validator("circuitBreakerFailures", default=5),
+            Validator("rateLimitRetries", default=3),
+            Validator("scanWorkers", default=8),
+            Validator("spigetBatchSize", default=10),
+            Validator("githubReleasesPerPage", default=10),
+            Validator("githubArtifactsPerPage", default=10),
+            Validator("githubGraphql", default=False),
+            Validator("githubGraphqlBatchSize", default=50),
+            Validator("poolConnections", default=10),
+            Validator("poolMaxsize", default=10),
+            Validator("chunkSize", default=65536),
+            Validator("cachePath", default=".plugwatch"),
+            Validator("httpCache", default=True),
+            Validator("httpCacheTtl", default=604800),
+            Validator("httpCacheSize", default=50),
+            Validator("storeSize", default=500),
+            Validator("backupCount", default=5),
+            Validator(
+                "daemonIntervals",
+                default={
+                    "directUrls": 3600,
+                    "github": 1800,
+                    "jenkins": 600,
+                    "spigot": 3600,
+                    "bukkit": 3600,
+                },
+            ),
+            Validator("daemonJitter", default=0.1),
+            Validator("daemonMaxBackoff", default=86400),
+            Validator("daemonPollInterval", default=5),
+            Validator("daemonPort", default=8654),
+        ],
+    )
+
+    # `envvar_prefix` = export envvars with `export DYNACONF_FOO=bar`.
+    # `settings_files` = Load these files in the order.
+    return {key.lower(): value for key, value in dynaconfSettings.as_dict().items()}
+
+
+settings = Settings()
+
+
+def get_plugins_paths():
+    # pluginsPath is either one path or a list of paths (e.g. one per server)
+    if isinstance(settings.pluginsPath, str):
+        return [settings.pluginsPath]
+    return list(settings.pluginsPath)
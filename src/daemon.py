@@ -0,0 +1,259 @@
+import ctypes
+import ctypes.util
+import json
+import math
+import os
+import random
+import struct
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.config import get_plugins_paths, settings
+from src.info import clear_source
+from src.process import collect_path_jobs, run_checks
+from src.web import clear_memos
+
+# inotify(7) events that mean a jar was added, removed or replaced. Jars being copied
+# in are only noticed once they're closed, not when they're created.
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_DELETE = 0x200
+
+sourceKeys = {
+    "spigotId": "spigot",
+    "bukkitSlug": "bukkit",
+    "githubRepo": "github",
+    "jenkinsServer": "jenkins",
+    "stableDirectUrl": "directUrls",
+    "experimentalDirectUrl": "directUrls",
+}
+
+schedule = {}
+scheduleLock = threading.Lock()
+startTime = time.time()
+
+
+class Watcher:
+    """Notices changes to plugins paths, with inotify where available."""
+
+    def __init__(self, paths):
+        self.paths = paths
+        self.event = threading.Event()
+        self.mtimes = self.get_mtimes()
+        self.inotify = False
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(os.O_CLOEXEC)
+            if fd < 0:
+                return
+
+            mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+            for path in paths:
+                if libc.inotify_add_watch(fd, os.fsencode(path), mask) < 0:
+                    os.close(fd)
+                    return
+        except (AttributeError, OSError, TypeError):
+            # No inotify (e.g. not Linux), so fall back to polling
+            return
+
+        self.inotify = True
+        threading.Thread(target=self.read_events, args=(fd,), daemon=True).start()
+
+    def read_events(self, fd):
+        while True:
+            data = os.read(fd, 4096)
+            offset = 0
+
+            while offset < len(data):
+                _, _, _, length = struct.unpack_from("iIII", data, offset)
+                name = data[offset + 16 : offset + 16 + length].rstrip(b"\0")
+                offset += 16 + length
+
+                # Only jars matter, not temporary files
+                if name.endswith(b".jar"):
+                    self.event.set()
+
+    def get_mtimes(self):
+        return [
+            os.stat(path).st_mtime_ns if os.path.exists(path) else None
+            for path in self.paths
+        ]
+
+    def changed(self):
+        if not self.inotify:
+            mtimes = self.get_mtimes()
+            if mtimes != self.mtimes:
+                self.mtimes = mtimes
+                self.event.set()
+
+        changed = self.event.is_set()
+        self.event.clear()
+        return changed
+
+
+class StatusHandler(BaseHTTPRequestHandler):
+    """Serves the daemon's schedule as JSON."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with scheduleLock:
+            body = json.dumps(
+                {
+                    "started": format_time(startTime),
+                    "plugins": [
+                        {
+                            "name": name,
+                            **entry,
+                            "nextCheck": format_time(entry["nextCheck"]),
+                            "sources": {
+                                source: format_time(nextCheck)
+                                for source, nextCheck in entry["sources"].items()
+                            },
+                        }
+                        for name, entry in sorted(schedule.items())
+                    ],
+                },
+                indent=4,
+            ).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def format_time(timestamp):
+    if not timestamp:
+        return None
+    return datetime.fromtimestamp(timestamp).isoformat(timespec="seconds")
+
+
+def get_sources(jsonInfo):
+    return {sourceKeys[key] for key in jsonInfo if key in sourceKeys}
+
+
+def get_interval(source):
+    # Sources missing from daemonIntervals use the longest interval
+    return settings.daemonIntervals.get(source, max(settings.daemonIntervals.values()))
+
+
+def get_next_check(source, failures):
+    # Failing plugins back off exponentially. Jitter spreads out plugins that would
+    # otherwise be checked at the same time.
+    interval = min(get_interval(source) * 2**failures, settings.daemonMaxBackoff)
+    jitter = random.uniform(-settings.daemonJitter, settings.daemonJitter)
+    return time.time() + interval * (1 + jitter)
+
+
+def update_schedule(jobs):
+    with scheduleLock:
+        sources = {}
+        for jsonInfo, _, _ in jobs:
+            sources.setdefault(jsonInfo["name"], set()).update(get_sources(jsonInfo))
+
+        for name in list(schedule):
+            if name not in sources:
+                del schedule[name]
+
+        # New plugins and sources are checked right away
+        for name, nameSources in sources.items():
+            entry = schedule.setdefault(
+                name,
+                {
+                    "lastCheck": None,
+                    "nextCheck": 0,
+                    "sources": {},
+                    "failures": 0,
+                    "lastError": None,
+                },
+            )
+            entry["sources"] = {
+                source: entry["sources"].get(source, 0) for source in nameSources
+            }
+            if entry["sources"]:
+                entry["nextCheck"] = min(entry["sources"].values())
+
+
+def check_due(jobs):
+    now = time.time()
+    with scheduleLock:
+        dueSources = {
+            name: [source for source, t in entry["sources"].items() if t <= now]
+            for name, entry in schedule.items()
+        }
+        dueJobs = [job for job in jobs if schedule[job[0]["name"]]["nextCheck"] <= now]
+    if not dueJobs:
+        return
+
+    # Only sources that are due are fetched again (once for all plugins paths). The
+    # others reuse what was fetched when they were last due. Downloads and hosts that
+    # were given up on are always tried again.
+    clear_memos([])
+    for jsonInfo, _, _ in dueJobs:
+        for source in dueSources[jsonInfo["name"]]:
+            clear_source(jsonInfo, source)
+    exceptions = run_checks(dueJobs, stopOnError=False)
+
+    results = {}
+    for job, exception in zip(dueJobs, exceptions):
+        results.setdefault(job[0]["name"], (job[0], []))[1].append(exception)
+
+    with scheduleLock:
+        for name, (jsonInfo, nameExceptions) in results.items():
+            entry = schedule[name]
+            exception = next((e for e in nameExceptions if e), None)
+
+            entry["lastCheck"] = format_time(time.time())
+            entry["failures"] = entry["failures"] + 1 if exception else 0
+            entry["lastError"] = repr(exception) if exception else None
+            for source in dueSources[name]:
+                entry["sources"][source] = get_next_check(source, entry["failures"])
+            entry["nextCheck"] = min(
+                entry["sources"].values(),
+                default=get_next_check(None, entry["failures"]),
+            )
+
+
+def find_jobs():
+    # Only jars are read again. Sources are fetched when their checks are due, so
+    # changes (including the daemon's own installs) don't fetch everything again.
+    return [
+        job
+        for pluginsPath in get_plugins_paths()
+        for job in collect_path_jobs(pluginsPath, skipInvalid=True)
+    ]
+
+
+def run_daemon():
+    statusServer = ThreadingHTTPServer(
+        ("127.0.0.1", settings.daemonPort), StatusHandler
+    )
+    statusServer.daemon_threads = True
+    threading.Thread(target=statusServer.serve_forever, daemon=True).start()
+    print(f"👀 Watching plugins. Status is at http://127.0.0.1:{settings.daemonPort}")
+
+    watcher = Watcher(get_plugins_paths())
+    jobs = find_jobs()
+    update_schedule(jobs)
+
+    while True:
+        if watcher.changed():
+            print("\n💡 Your plugins path changed, looking for plugins again...")
+            jobs = find_jobs()
+            update_schedule(jobs)
+
+        check_due(jobs)
+
+        # Wake up for the next check, or to look for changes
+        with scheduleLock:
+            nextCheck = min(
+                (entry["nextCheck"] for entry in schedule.values()), default=math.inf
+            )
+        time.sleep(max(0, min(nextCheck - time.time(), settings.daemonPollInterval)))
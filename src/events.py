@@ -0,0 +1,87 @@
+import json
+import sys
+import threading
+import time
+
+from sty import fg
+
+from src.metrics import context
+from src.utils import format_bytes
+
+outputFormat = "human"
+eventStream = None
+eventLock = threading.Lock()
+
+
+def set_output(format):
+    # With NDJSON output, events go to stdout and the human output to stderr
+    global outputFormat, eventStream
+
+    outputFormat = format
+    if format == "ndjson":
+        eventStream = sys.stdout
+        sys.stdout = sys.stderr
+
+
+def emit(event, **fields):
+    # Writes one event per line as soon as it happens, tagged with the plugin, plugins
+    # path and source being processed by this thread. Results are also shown in the
+    # human output.
+    record = {
+        "event": event,
+        "time": round(time.time(), 3),
+        "plugin": getattr(context, "plugin", None),
+        "path": getattr(context, "path", None),
+        "source": getattr(context, "source", None),
+        **fields,
+    }
+    render(record)
+    if outputFormat != "ndjson":
+        return
+
+    with eventLock:
+        eventStream.write(json.dumps(record) + "\n")
+        eventStream.flush()
+
+
+def render(record):
+    # The human output of an event, if it has one
+    event, result, error = record["event"], record.get("result"), record.get("error")
+
+    if event == "download":
+        if result == "downloaded":
+            print(
+                f"   📦 Downloaded {format_bytes(record['bytes'])}"
+                f" ({record['bytes']} bytes)"
+            )
+        elif result == "unchanged" and record.get("build"):
+            print(f"   ❕ Build #{record['build']} has already been downloaded")
+        elif result == "unchanged":
+            print("   ❕ File hasn't changed since the last download")
+        elif result == "rejected":
+            print(fg.red + f"   ❗ Download is broken! ({error})" + fg.rs)
+        elif result == "failed":
+            print(
+                fg.red
+                + "   ❗ Download failed!"
+                + (f" ({error})" if error else "")
+                + fg.rs
+            )
+    elif event == "install":
+        if result == "staged":
+            print(f"   📥 Staged {record['file']}")
+        elif result == "installed":
+            print(f"{fg.green}⬇️ Saved {record['file']}{fg.rs}")
+        elif result == "unchanged":
+            print(f"   ❕ {record['file']} is already up to date, skipping")
+        elif result == "failed":
+            print(
+                fg.red + f"   ❗ Couldn't install {record['file']}! ({error})" + fg.rs
+            )
+    elif event == "summary" and record["failed"]:
+        print(
+            fg.red
+            + f"\n❗ {len(record['failed'])} plugin(s) couldn't be checked:"
+            + f" {', '.join(record['failed'])}"
+            + fg.rs
+        )
@@ -3,118 +3,632 @@ import json
 import os
 import re
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from glob import glob
+from urllib.parse import quote
 from zipfile import BadZipFile, ZipFile
 
-from dateutil import parser
 from sty import RgbFg, Style, fg
 
-from src.config import settings
-from src.utils import compare_versions, reg_ex_jar, remove_empty_fields
-from src.web import request_api, request_github_api
+from src.cache import (
+    clear_jar_index,
+    get_indexed_jar,
+    get_jar_key,
+    index_jar,
+    load_generated_jars,
+    save_generated_jars,
+    save_jar_index,
+    write_text_atomic,
+)
+from src.config import get_plugins_paths, settings
+from src.metrics import measure, tagged
+from src.utils import (
+    get_digests,
+    pluginDescriptors,
+    rank_versions,
+    reg_ex_jar,
+    remove_empty_fields,
+)
+from src.web import (
+    RequestFailed,
+    clear_memos,
+    request_api,
+    request_github_api,
+    request_github_graphql,
+)
+
+registries = {}
+mergedRegistries = {}
+pluginsJsonLock = threading.Lock()
+spigetResources = {}
+githubReleases = {}
+# Resolved artifacts of Jenkins builds, by job, build and regular expressions
+jenkinsBuilds = {}
+jenkinsBuildsLock = threading.Lock()
+
+# Only the fields of Jenkins builds get_latest_info uses
+jenkinsBuildTree = "number,result,artifacts[relativePath],fingerprint[fileName,hash]"
+
+# Only the fields get_latest_info uses, for the latest release and the most recent
+# releases (to find the latest pre-release)
+githubReleaseFragment = """
+fragment release on Release {
+  tagName
+  isPrerelease
+  createdAt
+  releaseAssets(first: 50) { nodes { downloadUrl } }
+}
+"""
+
+
+class InvalidPlugin(Exception):
+    """A jar that can't be read, or that doesn't have a plugin descriptor."""
 
 
 # Derived from pluGET (https://github.com/Neocky/pluGET)
-def cook_breakfast(jarPath, **args):
+def read_plugin_yml(jarPath):
+    pluginInfo = {"name": None, "version": None}
+
     try:
-        with ZipFile(jarPath, "r") as pluginJar:
+        # ZipFile only reads the central directory up front, so only the descriptor
+        # itself is read from the rest of the jar (and counted)
+        with measure("scan") as record, ZipFile(jarPath, "r") as pluginJar:
+            record["jar"] = os.path.basename(jarPath)
+            descriptor = next(
+                name for name in pluginDescriptors if name in pluginJar.NameToInfo
+            )
+            record["bytes"] = pluginJar.NameToInfo[descriptor].compress_size
             with io.TextIOWrapper(
-                pluginJar.open("plugin.yml"), encoding="utf-8"
+                pluginJar.open(descriptor), encoding="utf-8"
             ) as pluginYml:
                 for line in pluginYml:
-                    # Extract name
-                    if re.match(r"\s*name:", line):
-                        pluginName = (
-                            re.sub(r"^\s*name:", "", line)
-                            .replace("\n", "")
-                            .replace("'", "")
-                            .replace('"', "")
-                            .strip()
-                        )
-                    # Extract version
-                    if args.get("includeVersion") and re.match(r"\s*version:", line):
-                        pluginVersion = (
-                            re.sub(r"^\s*version:", "", line)
-                            .replace("\n", "")
-                            .replace("'", "")
-                            .replace('"', "")
-                            .strip()
+                    # Extract top-level name and version, and stop once both are found
+                    match = re.match(r"(name|version):(.*)", line)
+                    if match:
+                        pluginInfo[match[1]] = (
+                            match[2].replace("'", "").replace('"', "").strip()
                         )
-    except (BadZipFile, KeyError, UnicodeDecodeError):
-        print(f"   ❌ {jarPath} is not a valid plugin! Exiting.\n")
-        sys.exit()
+                    if pluginInfo["name"] and pluginInfo["version"]:
+                        break
+            # Attributed to the plugin in the jar, like the rest of its records
+            record["plugin"] = pluginInfo["name"]
+    except (BadZipFile, StopIteration, UnicodeDecodeError, OSError):
+        raise InvalidPlugin(jarPath)
+
+    return pluginInfo
+
 
-    jarInfo = {"name": pluginName}
+def cook_breakfast(jarPath, **args):
+    # Unchanged jars are never reopened
+    pluginInfo = get_indexed_jar(jarPath)
+
+    if not pluginInfo:
+        pluginInfo = read_plugin_yml(jarPath)
+        index_jar(jarPath, pluginInfo)
+
+    jarInfo = {"name": pluginInfo["name"]}
     if args.get("includeVersion"):
-        jarInfo.update({"version": pluginVersion})
+        jarInfo.update({"version": pluginInfo["version"]})
     if args.get("includePath"):
         jarInfo.update({"jarPath": jarPath})
 
     return jarInfo
 
 
+def get_jar_paths(pluginsPath=None):
+    # All plugins paths are scanned unless one is specified
+    return [
+        jarPath
+        for pluginsPath in ([pluginsPath] if pluginsPath else get_plugins_paths())
+        for jarPath in glob(rf"{pluginsPath}/*.jar")
+    ]
+
+
 def get_jar_info(**args):
-    jarPaths = list(glob(rf"{settings.pluginsPath}/*.jar"))
+    # Only the jars in jarPaths are read, if given
+    if "jarPaths" in args:
+        jarPaths = args["jarPaths"]
+    else:
+        jarPaths = get_jar_paths(args.get("pluginsPath"))
     jarInfoList = []
 
-    if jarPaths:
-        for jarPath in jarPaths:
-            # If name is specified
-            if args.get("name"):
-                jarName = cook_breakfast(jarPath)["name"]
-                if re.fullmatch(args.get("name"), jarName, flags=re.I):
-                    return cook_breakfast(
-                        jarPath, includeVersion=True, includePath=True
-                    )
-            else:
-                jarInfoList.append(
-                    cook_breakfast(
-                        jarPath,
-                        includeVersion=args.get("includeVersion"),
-                        includePath=args.get("includePath"),
-                    )
+    # Jars are read concurrently (this mostly helps on slow disks and network
+    # filesystems), but results keep the order of jarPaths
+    def read_jar(jarPath):
+        try:
+            return cook_breakfast(
+                jarPath,
+                includeVersion=args.get("includeVersion"),
+                includePath=args.get("includePath"),
+            )
+        except InvalidPlugin:
+            # Jars can be half-copied while the daemon is running
+            if not args.get("skipInvalid"):
+                raise
+            print(f"   ❕ {jarPath} is not a valid plugin, skipping")
+            return None
+
+    executor = ThreadPoolExecutor(settings.scanWorkers)
+    try:
+        for jarInfo in executor.map(read_jar, jarPaths):
+            if jarInfo:
+                jarInfoList.append(jarInfo)
+    except InvalidPlugin as exception:
+        print(f"   ❌ {exception} is not a valid plugin! Exiting.\n")
+        sys.exit()
+    finally:
+        executor.shutdown(cancel_futures=True)
+        save_jar_index()
+
+    return jarInfoList
+
+
+def rebuild_jar_index():
+    clear_jar_index()
+    return get_jar_info()
+
+
+def validate_plugins_json(plugins):
+    # A light check against schema.json: field names, types and duplicate names
+    with open(os.path.join(os.path.dirname(__file__), "..", "schema.json")) as f:
+        properties = json.load(f)["definitions"]["Plugin"]["properties"]
+    jsonTypes = {
+        "string": str,
+        "integer": int,
+        "boolean": bool,
+        "array": list,
+    }
+    names = set()
+
+    for i, plugin in enumerate(plugins):
+        name = plugin.get("name")
+        if not isinstance(name, str):
+            print(f"❕ plugins.json entry {i + 1} doesn't have a name!")
+            continue
+        if name.lower() in names:
+            print(f"❕ {name} has more than one plugins.json entry")
+        names.add(name.lower())
+
+        for key, value in plugin.items():
+            if key not in properties:
+                print(f"❕ {name} has an unknown plugins.json field {key}")
+            elif value not in ("", None) and not isinstance(
+                value, jsonTypes[properties[key]["type"]]
+            ):
+                print(f"❕ {name} has an invalid value for {key}")
+
+
+def make_registry(plugins, key):
+    plugins = [plugin for plugin in plugins if "name" in plugin]
+    return {
+        "key": key,
+        "plugins": plugins,
+        "names": {plugin["name"].lower(): plugin for plugin in reversed(plugins)},
+    }
+
+
+def load_plugins_json(path):
+    # A plugins.json is only read (and validated) again when it changes
+    mtime = os.stat(path).st_mtime_ns
+
+    with pluginsJsonLock:
+        if path not in registries or registries[path]["key"] != mtime:
+            with open(path) as f:
+                plugins = json.load(f)["plugins"]
+
+            validate_plugins_json(plugins)
+            registries[path] = make_registry(remove_empty_fields(plugins), mtime)
+
+        return registries[path]
+
+
+def get_registry(pluginsPath=None):
+    registry = load_plugins_json("plugins.json")
+
+    # A plugins.json in a plugins path overrides entries of the main one by name, and
+    # can add entries of its own
+    overridesPath = os.path.join(pluginsPath or "", "plugins.json")
+    if not pluginsPath or not os.path.exists(overridesPath):
+        return registry
+    overrides = load_plugins_json(overridesPath)
+    key = (registry["key"], overrides["key"])
+
+    with pluginsJsonLock:
+        if mergedRegistries.get(overridesPath, {}).get("key") != key:
+            plugins = [
+                {**plugin, **overrides["names"].get(plugin["name"].lower(), {})}
+                for plugin in registry["plugins"]
+            ] + [
+                plugin
+                for plugin in overrides["plugins"]
+                if plugin["name"].lower() not in registry["names"]
+            ]
+            mergedRegistries[overridesPath] = make_registry(plugins, key)
+
+        return mergedRegistries[overridesPath]
+
+
+def has_path_entry(name, pluginsPath):
+    # Whether the plugins.json in a plugins path has an entry of its own for a plugin
+    overridesPath = os.path.join(pluginsPath, "plugins.json")
+    return (
+        os.path.exists(overridesPath)
+        and name.lower() in load_plugins_json(overridesPath)["names"]
+    )
+
+
+def get_json_info(name=None, pluginsPath=None):
+    registry = get_registry(pluginsPath)
+
+    # If name is specified
+    if name:
+        if name.lower() in registry["names"]:
+            return registry["names"][name.lower()]
+
+        # Names used to be matched as regular expressions
+        return next(
+            (
+                plugin
+                for plugin in registry["plugins"]
+                if re.fullmatch(name, plugin["name"], flags=re.I)
+            ),
+            None,
+        )
+    return registry["plugins"]
+
+
+def generate_plugins_json(addMissing=False):
+    # When adding missing entries, only jars added or changed since the last run are
+    # read, so entries that were removed from plugins.json on purpose stay removed.
+    # Returns the number of entries added.
+    addMissing = addMissing and os.path.exists("plugins.json")
+    lastJars = load_generated_jars() if addMissing else {}
+
+    jars = {}
+    changedPaths = []
+    for jarPath in get_jar_paths():
+        key = get_jar_key(jarPath)
+        lastJar = lastJars.get(os.path.abspath(jarPath))
+        if lastJar and lastJar["key"] == key:
+            jars[os.path.abspath(jarPath)] = lastJar
+        else:
+            changedPaths.append(jarPath)
+            jars[os.path.abspath(jarPath)] = {"key": key, "name": None}
+
+    names = set(get_registry()["names"]) if addMissing else set()
+    newEntries = []
+    for jarPath, jarInfo in zip(changedPaths, get_jar_info(jarPaths=changedPaths)):
+        jars[os.path.abspath(jarPath)]["name"] = jarInfo["name"]
+
+        # Plugins in more than one plugins path only get one entry
+        if jarInfo["name"] and jarInfo["name"].lower() not in names:
+            names.add(jarInfo["name"].lower())
+            newEntries.append({"name": jarInfo["name"]})
+
+    if addMissing:
+        report_stale_entries(jars)
+        if newEntries:
+            with open("plugins.json") as f:
+                text = f.read()
+            write_text_atomic(
+                "plugins.json", add_plugins_json_entries(text, newEntries)
+            )
+        print(f"   📋 Added {len(newEntries)} missing plugin(s)")
+    else:
+        pluginsJson = {
+            "$schema": "https://github.com/shifterest/plugwatch/raw/main/schema.json",
+            "plugins": newEntries,
+        }
+        write_text_atomic("plugins.json", json.dumps(pluginsJson, indent=4))
+
+    save_generated_jars(jars)
+    return len(newEntries)
+
+
+def report_stale_entries(jars):
+    # Entries of plugins that no plugins path has a jar of
+    currentNames = {jar["name"].lower() for jar in jars.values() if jar["name"]}
+
+    for plugin in get_registry()["plugins"]:
+        if plugin["name"].lower() not in currentNames:
+            print(f"   ❕ {plugin['name']} has a plugins.json entry, but no jar")
+
+
+def find_plugins_array(text):
+    # Offsets of the brackets of the top-level "plugins" array, found by scanning
+    # the JSON without parsing it, so the rest of the file is left as it is
+    depth = 0
+    key = None
+    start = None
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == '"':
+            end = i + 1
+            while text[end] != '"':
+                end += 2 if text[end] == "\\" else 1
+            if depth == 1:
+                key = json.loads(text[i : end + 1])
+            i = end
+        elif char in "[{":
+            depth += 1
+            if depth == 2 and char == "[" and key == "plugins":
+                start = i
+        elif char in "]}":
+            if depth == 2 and start is not None:
+                return start, i
+            depth -= 1
+        i += 1
+    raise ValueError("plugins.json doesn't have a plugins array")
+
+
+def add_plugins_json_entries(text, entries):
+    # Entries are appended to the plugins array, indented like the existing ones
+    start, end = find_plugins_array(text)
+    body = text[start + 1 : end].rstrip()
+
+    closingIndent = text[text.rfind("\n", 0, end) + 1 : end]
+    if not closingIndent.isspace():
+        closingIndent = ""
+    indent = closingIndent + "    "
+    if body.strip():
+        firstEntry = text.find("{", start)
+        entryIndent = text[text.rfind("\n", 0, firstEntry) + 1 : firstEntry]
+        if entryIndent.isspace() and entryIndent.startswith(closingIndent):
+            indent = entryIndent
+    else:
+        body = ""
+
+    step = indent[len(closingIndent) :] or "    "
+    formattedEntries = ",\n".join(
+        indent + json.dumps(entry, indent=step).replace("\n", "\n" + indent)
+        for entry in entries
+    )
+    return (
+        text[: start + 1]
+        + (body + "," if body else "")
+        + "\n"
+        + formattedEntries
+        + "\n"
+        + closingIndent
+        + text[end:]
+    )
+
+
+def fetch_spiget_resource(spigotId):
+    url = f"{settings.spigetApiUrl}/resources/{spigotId}"
+    resourceDetails = request_api(url)
+
+    # Invalid IDs have no versions
+    if "error" in resourceDetails:
+        return resourceDetails, None
+    return resourceDetails, request_api(f"{url}/versions/latest")
+
+
+def prefetch_spiget(jsonInfoList):
+    # Fetch every SpigotMC resource up front, in concurrent batches, unless it was
+    # already fetched
+    spigotNames = {}
+    for entry in jsonInfoList:
+        if "spigotId" in entry and entry["spigotId"] not in spigetResources:
+            spigotNames.setdefault(entry["spigotId"], []).append(entry["name"])
+    spigotIds = list(spigotNames)
+
+    with ThreadPoolExecutor(settings.spigetBatchSize) as executor:
+        for i in range(0, len(spigotIds), settings.spigetBatchSize):
+            batch = spigotIds[i : i + settings.spigetBatchSize]
+            spigetResources.update(
+                (spigotId, resource)
+                for spigotId, resource in zip(
+                    batch,
+                    executor.map(
+                        lambda spigotId: try_fetch_spiget_resource(
+                            spigotId, ", ".join(dict.fromkeys(spigotNames[spigotId]))
+                        ),
+                        batch,
+                    ),
                 )
+                if resource
+            )
+
+    return len(spigotIds)
+
 
-    if args.get("name"):
+def try_fetch_spiget_resource(spigotId, names):
+    # Failed resources are left to each plugin's check, which reports the failure.
+    # Requests are attributed to the plugins that use the resource.
+    try:
+        with tagged(plugin=names, source="spigot"):
+            return fetch_spiget_resource(spigotId)
+    except RequestFailed:
         return None
-    return jarInfoList
 
 
-def get_json_info(name=None):
-    with open("plugins.json") as pluginsJson:
-        # If name is specified
-        if name:
-            return next(
-                (
-                    plugin
-                    for plugin in json.load(pluginsJson)["plugins"]
-                    if re.fullmatch(name, plugin["name"], flags=re.I)
-                ),
+def get_spiget_resource(spigotId):
+    if spigotId not in spigetResources:
+        spigetResources[spigotId] = fetch_spiget_resource(spigotId)
+    return spigetResources[spigotId]
+
+
+def get_fingerprint(build, url):
+    # Jenkins fingerprints artifacts with their MD5
+    if not url:
+        return {}
+    return {
+        "md5": fingerprint["hash"]
+        for fingerprint in build.get("fingerprint") or []
+        if fingerprint.get("fileName") == url.rsplit("/", 1)[1]
+    }
+
+
+def resolve_jenkins_build(url, buildName, build, jsonInfo):
+    # Artifacts of a job are only matched again when its build number changes
+    key = (
+        url,
+        buildName,
+        jsonInfo.get("jenkinsRegEx"),
+        jsonInfo.get("jenkinsRegExInverse"),
+    )
+    with jenkinsBuildsLock:
+        resolved = jenkinsBuilds.get(key)
+
+    if not resolved or resolved["number"] != build["number"]:
+        artifactUrl = reg_ex_jar(
+            (
+                f"{url}/{buildName}/artifact/" + artifact["relativePath"]
+                for artifact in build.get("artifacts") or []
+            ),
+            jsonInfo.get("jenkinsRegEx"),
+            jsonInfo.get("jenkinsRegExInverse"),
+        )
+        resolved = {
+            "number": build["number"],
+            "url": artifactUrl,
+            "digests": get_fingerprint(build, artifactUrl),
+        }
+        with jenkinsBuildsLock:
+            jenkinsBuilds[key] = resolved
+
+    return resolved
+
+
+def to_rest_release(release):
+    # Convert a GraphQL release to the shape of the REST API's
+    return {
+        "tag_name": release["tagName"],
+        "prerelease": release["isPrerelease"],
+        "created_at": release["createdAt"],
+        "assets": [
+            {"browser_download_url": asset["downloadUrl"]}
+            for asset in release["releaseAssets"]["nodes"]
+        ],
+    }
+
+
+def prefetch_github(jsonInfoList):
+    # Fetch the latest releases of many repositories per GraphQL query
+    if not (settings.githubGraphql and settings.get("githubToken")):
+        return 0
+
+    githubRepos = list(
+        dict.fromkeys(
+            entry["githubRepo"]
+            for entry in jsonInfoList
+            if "githubRepo" in entry and entry["githubRepo"] not in githubReleases
+        )
+    )
+    fetchedCount = 0
+
+    for i in range(0, len(githubRepos), settings.githubGraphqlBatchSize):
+        batch = githubRepos[i : i + settings.githubGraphqlBatchSize]
+        query = "query {\n"
+        for j, githubRepo in enumerate(batch):
+            owner, name = githubRepo.split("/", 1)
+            query += (
+                f"  r{j}: repository(owner: {json.dumps(owner)},"
+                f" name: {json.dumps(name)}) {{\n"
+                "    latestRelease { ...release }\n"
+                "    releases(first: 10, orderBy: {field: CREATED_AT,"
+                " direction: DESC}) { nodes { ...release } }\n"
+                "  }\n"
+            )
+        query += "}\n" + githubReleaseFragment
+
+        # Repositories that couldn't be fetched fall back to the REST API
+        try:
+            data = request_github_graphql(query).get("data") or {}
+        except RequestFailed:
+            data = {}
+        for j, githubRepo in enumerate(batch):
+            repository = data.get(f"r{j}")
+            if not repository:
+                continue
+
+            releasesList = []
+            if repository["latestRelease"]:
+                releasesList.append(to_rest_release(repository["latestRelease"]))
+            latestPrerelease = next(
+                (r for r in repository["releases"]["nodes"] if r["isPrerelease"]),
                 None,
             )
-        return remove_empty_fields(json.load(pluginsJson)["plugins"])
+            if latestPrerelease:
+                releasesList.append(to_rest_release(latestPrerelease))
 
+            githubReleases[githubRepo] = releasesList
+            fetchedCount += 1
 
-def generate_plugins_json(addMissing=False):
-    currentInfo = get_jar_info(includeVersion=False, includePath=False)
-    # If generating missing entries
-    if addMissing and os.path.exists("plugins.json"):
-        jsonInfoNames = [entry["name"] for entry in get_json_info()]
-        currentInfo = get_json_info() + [
-            entry for entry in currentInfo if entry["name"] not in jsonInfoNames
+    return fetchedCount
+
+
+def get_github_releases(githubRepo):
+    if githubRepo in githubReleases:
+        return githubReleases[githubRepo]
+
+    # A short page of releases usually has both the latest release and pre-release.
+    # Only ask for the latest release separately if the page is all pre-releases.
+    url = f"{settings.githubApiUrl}/repos/{githubRepo}"
+    releasesList = request_github_api(
+        f"{url}/releases?per_page={settings.githubReleasesPerPage}"
+    )
+    # Errors come back as an object with a message instead of a list
+    if not isinstance(releasesList, list):
+        raise RequestFailed(
+            f"{releasesList.get('message', 'Invalid response')} from {url}/releases"
+        )
+    releasesList = list(releasesList)
+
+    if releasesList and all(r["prerelease"] for r in releasesList):
+        latestRelease = request_github_api(f"{url}/releases/latest")
+        if "tag_name" in latestRelease:
+            releasesList.append(latestRelease)
+
+    return releasesList
+
+
+def get_github_artifacts(jsonInfo):
+    # Artifacts can only be downloaded with a token
+    if not settings.get("githubToken"):
+        return []
+
+    url = f"{settings.githubApiUrl}/repos/{jsonInfo['githubRepo']}"
+    url += f"/actions/artifacts?per_page={settings.githubArtifactsPerPage}"
+    if "githubArtifactName" in jsonInfo:
+        url += f"&name={quote(jsonInfo['githubArtifactName'])}"
+
+    artifacts = request_github_api(url).get("artifacts", [])
+    if "githubBranch" in jsonInfo:
+        artifacts = [
+            artifact
+            for artifact in artifacts
+            if (artifact.get("workflow_run") or {}).get("head_branch")
+            == jsonInfo["githubBranch"]
         ]
-    pluginsJson = {
-        "$schema": "https://github.com/shifterest/plugwatch/raw/main/schema.json",
-        "plugins": currentInfo,
-    }
 
-    with open("plugins.json", "w") as f:
-        json.dump(pluginsJson, f, indent=4)
+    return artifacts
+
 
-    if currentInfo:
-        return True
-    return False
+def clear_prefetched():
+    spigetResources.clear()
+    githubReleases.clear()
+
+
+def clear_source(jsonInfo, source):
+    # Forgets what was fetched from one source of an entry, so it's fetched again
+    # while the entry's other sources are reused. DevBukkit and direct URLs aren't
+    # fetched when checking.
+    urls = []
+    if source == "spigot":
+        spigetResources.pop(jsonInfo["spigotId"], None)
+        urls.append(f"{settings.spigetApiUrl}/resources/{jsonInfo['spigotId']}")
+    elif source == "github":
+        githubReleases.pop(jsonInfo["githubRepo"], None)
+        urls.append(f"{settings.githubApiUrl}/repos/{jsonInfo['githubRepo']}")
+    elif source == "jenkins":
+        url = jsonInfo["jenkinsServer"]
+        urls.append(url if "://" in url else "https://" + url)
+    clear_memos(urls)
 
 
 def get_latest_info(jsonInfo, currentVersion):
@@ -125,7 +639,8 @@ def get_latest_info(jsonInfo, currentVersion):
     fg.github = Style(RgbFg(155, 31, 232))
     fg.jenkins = Style(RgbFg(76, 201, 240))
     latestVersion = None
-    mostRecentVersion = None
+    # Latest versions of sources that can be downloaded, ranked once all are fetched
+    sourceVersions = {}
     # githubRegEx and githubRegExInverse is included for artifacts
     info = {
         "moreRecentPrecedence": [],
@@ -147,16 +662,17 @@ def get_latest_info(jsonInfo, currentVersion):
 
     # SpigotMC
     if "spigotId" in jsonInfo:
-        url = "https://api.spiget.org/v2/resources/" + str(jsonInfo["spigotId"])
-        resourceDetails = request_api(url)
+        url = f"{settings.spigetApiUrl}/resources/" + str(jsonInfo["spigotId"])
+        resourceDetails, resourceLatestVersion = get_spiget_resource(
+            jsonInfo["spigotId"]
+        )
 
         # Check if ID is valid
         if "error" in resourceDetails:
             print(fg.red + "   ➡️ [SpigotMC] Error:", resourceDetails["error"] + fg.rs)
         else:
-            resourceLatestVersion = request_api(f"{url}/versions/latest")
             latestTestedVersion = resourceDetails["testedVersions"][-1]
-            mostRecentVersion = latestVersion = info["spigot"]["version"] = re.sub(
+            latestVersion = info["spigot"]["version"] = re.sub(
                 "^v", "", resourceLatestVersion["name"]
             )
 
@@ -190,28 +706,26 @@ def get_latest_info(jsonInfo, currentVersion):
                     f" {latestVersion} (tested on {latestTestedVersion})"
                 )
 
-            if (
-                "url" in info["spigot"]
-                and currentVersion
-                and compare_versions(latestVersion, currentVersion)
-            ):
-                info["moreRecentPrecedence"].append("spigot")
+            if "url" in info["spigot"]:
+                sourceVersions["spigot"] = latestVersion
 
     # DevBukkit
     if "bukkitSlug" in jsonInfo:
         info["bukkit"]["url"] = (
-            "https://dev.bukkit.org/projects/"
-            + jsonInfo["bukkitSlug"]
-            + "/files/latest"
+            f"{settings.bukkitUrl}/projects/" + jsonInfo["bukkitSlug"] + "/files/latest"
         )
         print(f"   {fg.bukkit}➡️ [DevBukkit]{fg.rs} Generated URL")
 
     # GitHub
     if "githubRepo" in jsonInfo:
-        url = "https://api.github.com/repos/" + jsonInfo["githubRepo"]
-        releasesList = request_github_api(f"{url}/releases")
+        from dateutil import parser
+
+        url = f"{settings.githubApiUrl}/repos/" + jsonInfo["githubRepo"]
+        releasesList = get_github_releases(jsonInfo["githubRepo"])
 
         # Releases
+        latestVersion = None
+        latestReleaseTimestamp = 0
         if len(releasesList):
             latestRelease = next((r for r in releasesList if not r["prerelease"]), None)
             latestPrerelease = next((r for r in releasesList if r["prerelease"]), None)
@@ -225,11 +739,18 @@ def get_latest_info(jsonInfo, currentVersion):
                     datetime.timestamp(parser.parse(latestRelease["created_at"]))
                 )
 
+                assets = {
+                    a["browser_download_url"]: a.get("digest")
+                    for a in latestRelease["assets"]
+                }
                 info["github"]["releaseUrl"] = reg_ex_jar(
-                    (a["browser_download_url"] for a in latestRelease["assets"]),
+                    assets,
                     jsonInfo.get("githubRegEx"),
                     jsonInfo.get("githubRegExInverse"),
                 )
+                info["github"]["releaseDigests"] = get_digests(
+                    assets.get(info["github"]["releaseUrl"])
+                )
 
                 print(
                     f"   {fg.github}➡️ [GitHub]{fg.rs} Fetched latest release"
@@ -238,7 +759,7 @@ def get_latest_info(jsonInfo, currentVersion):
 
             # Latest pre-release
             if latestPrerelease and latestPrerelease["assets"]:
-                latestVersion = latestPrereleaseVersion = re.sub(
+                latestPrereleaseVersion = re.sub(
                     r"^v", "", latestPrerelease["tag_name"]
                 )
                 latestPrereleaseTimestamp = int(
@@ -251,83 +772,97 @@ def get_latest_info(jsonInfo, currentVersion):
                         " than latest pre-release"
                     )
                 else:
+                    assets = {
+                        a["browser_download_url"]: a.get("digest")
+                        for a in latestPrerelease["assets"]
+                    }
                     info["github"]["prereleaseUrl"] = reg_ex_jar(
-                        (a["browser_download_url"] for a in latestPrerelease["assets"]),
+                        assets,
                         jsonInfo.get("githubRegEx"),
                         jsonInfo.get("githubRegExInverse"),
                     )
+                    info["github"]["prereleaseDigests"] = get_digests(
+                        assets.get(info["github"]["prereleaseUrl"])
+                    )
 
                     print(
                         f"   {fg.github}➡️ [GitHub]{fg.rs} Fetched latest pre-release"
                         f" {latestPrereleaseVersion}"
                     )
 
-            if currentVersion and compare_versions(latestVersion, currentVersion):
-                if (
-                    latestVersion
-                    and mostRecentVersion
-                    and compare_versions(latestVersion, mostRecentVersion)
-                ):
-                    mostRecentVersion = latestVersion
-                    info["moreRecentPrecedence"].insert(0, "github")
-                else:
-                    info["moreRecentPrecedence"].append("github")
+                    # Rank the version that would be downloaded
+                    if not (settings.preferStable and info["github"].get("releaseUrl")):
+                        latestVersion = latestPrereleaseVersion
+
+            sourceVersions["github"] = latestVersion
 
         # Actions
-        artifacts = request_github_api(f"{url}/actions/artifacts")
+        artifacts = get_github_artifacts(jsonInfo)
 
-        if artifacts["total_count"]:
+        if artifacts:
             latestArtifact = next(
-                (
-                    artifact
-                    for artifact in artifacts["artifacts"]
-                    if not artifact["expired"]
-                ),
+                (artifact for artifact in artifacts if not artifact["expired"]),
                 None,
             )
 
             if latestArtifact:
                 info["github"]["artifactUrl"] = latestArtifact["archive_download_url"]
+                info["github"]["artifactDigests"] = get_digests(
+                    latestArtifact.get("digest")
+                )
+                info["github"]["artifactSize"] = latestArtifact.get("size_in_bytes")
 
                 print(f"   {fg.github}➡️ [GitHub]{fg.rs} Fetched latest artifact")
 
     # Jenkins
     if "jenkinsServer" in jsonInfo:
-        url = "https://" + jsonInfo["jenkinsServer"]
-
-        # Last stable build
-        lastStableBuild = request_api(f"{url}/lastStableBuild/api/json")
-
-        info["jenkins"]["stableBuildUrl"] = reg_ex_jar(
-            (
-                f"{url}/lastStableBuild/artifact/" + path["relativePath"]
-                for path in lastStableBuild["artifacts"]
-            ),
-            jsonInfo.get("jenkinsRegEx"),
-            jsonInfo.get("jenkinsRegExInverse"),
+        url = jsonInfo["jenkinsServer"]
+        if "://" not in url:
+            url = "https://" + url
+
+        # Both builds come in one response with only the fields that are needed
+        job = request_api(
+            f"{url}/api/json?tree=lastStableBuild[{jenkinsBuildTree}],"
+            f"lastSuccessfulBuild[{jenkinsBuildTree}]"
         )
+        lastStableBuild = job.get("lastStableBuild")
+        lastSuccessfulBuild = job.get("lastSuccessfulBuild")
 
-        print(f"   {fg.jenkins}➡️ [Jenkins]{fg.rs} Fetched last stable build")
-
-        # Last successful build
-        lastSuccessfulBuild = request_api(f"{url}/lastSuccessfulBuild/api/json")
-
-        # Skip if both builds are the same
-        if lastStableBuild["number"] == lastSuccessfulBuild["number"]:
+        # Last stable build
+        if lastStableBuild:
+            stableBuild = resolve_jenkins_build(
+                url, "lastStableBuild", lastStableBuild, jsonInfo
+            )
+            info["jenkins"]["stableBuildUrl"] = stableBuild["url"]
+            info["jenkins"]["stableBuildNumber"] = stableBuild["number"]
+            info["jenkins"]["stableBuildDigests"] = stableBuild["digests"]
+
+            print(f"   {fg.jenkins}➡️ [Jenkins]{fg.rs} Fetched last stable build")
+
+        # Last successful build, skipped if both builds are the same
+        if (
+            lastStableBuild
+            and lastSuccessfulBuild
+            and lastStableBuild["number"] == lastSuccessfulBuild["number"]
+        ):
             print(
                 f"   {fg.jenkins}❕ [Jenkins]{fg.rs} Last stable build is also the last"
                 " successful build"
             )
-        else:
-            info["jenkins"]["successfulBuildUrl"] = reg_ex_jar(
-                (
-                    f"{url}/lastSuccessfulBuild/artifact/" + path["relativePath"]
-                    for path in lastStableBuild["artifacts"]
-                ),
-                jsonInfo.get("jenkinsRegEx"),
-                jsonInfo.get("jenkinsRegExInverse"),
+        elif lastSuccessfulBuild:
+            successfulBuild = resolve_jenkins_build(
+                url, "lastSuccessfulBuild", lastSuccessfulBuild, jsonInfo
             )
+            info["jenkins"]["successfulBuildUrl"] = successfulBuild["url"]
+            info["jenkins"]["successfulBuildNumber"] = successfulBuild["number"]
+            info["jenkins"]["successfulBuildDigests"] = successfulBuild["digests"]
 
             print(f"   {fg.jenkins}➡️ [Jenkins]{fg.rs} Fetched last successful build")
 
+    info["versions"] = sourceVersions
+
+    # Sources with a newer version than the installed one, newest first
+    if currentVersion:
+        info["moreRecentPrecedence"] = rank_versions(sourceVersions, currentVersion)
+
     return remove_empty_fields(info)
@@ -0,0 +1,208 @@
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from zipfile import BadZipFile, ZipFile
+
+from src.cache import get_cache_path, invalidate_jars, write_json_atomic
+from src.config import settings
+from src.events import emit
+from src.metrics import context, measure
+from src.utils import pluginDescriptors
+
+stagedInstalls = []
+stagedInstallsLock = threading.Lock()
+
+
+def get_staging_path(pluginsPath):
+    # Downloads wait here (on the same filesystem) until every plugin is checked
+    path = os.path.join(pluginsPath, ".plugwatch-staging")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def is_valid_plugin(path):
+    try:
+        with ZipFile(path) as jar:
+            return any(name in jar.NameToInfo for name in pluginDescriptors)
+    except (BadZipFile, OSError):
+        return False
+
+
+def link_or_copy(source, destination):
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def stage_install(stagedPath, path, replacedPath=None, onInstall=None):
+    # Queues a downloaded jar to replace replacedPath (and anything at path) once the
+    # run's checks are done. Returns False if the jar isn't a valid plugin.
+    if not is_valid_plugin(stagedPath):
+        os.remove(stagedPath)
+        return False
+
+    with stagedInstallsLock:
+        stagedInstalls.append(
+            {
+                "staged": os.path.abspath(stagedPath),
+                "path": os.path.abspath(path),
+                "replaced": [
+                    os.path.abspath(p)
+                    for p in dict.fromkeys((replacedPath, path))
+                    if p and os.path.exists(p)
+                ],
+                "plugin": getattr(context, "plugin", None),
+                "source": getattr(context, "source", None),
+                "onInstall": onInstall,
+            }
+        )
+    return True
+
+
+def discard_installs():
+    with stagedInstallsLock:
+        for install in stagedInstalls:
+            if os.path.exists(install["staged"]):
+                os.remove(install["staged"])
+        stagedInstalls.clear()
+
+
+def commit_installs():
+    # Swaps every staged jar into place in one pass. Replaced jars are linked into a
+    # backup first, and a journal is written before anything is touched, so an
+    # interrupted commit is rolled back the next time plugwatch starts.
+    with stagedInstallsLock:
+        installs = list(stagedInstalls)
+        stagedInstalls.clear()
+    if not installs:
+        return 0
+
+    transactionPath = os.path.abspath(
+        get_cache_path("backups", datetime.now().strftime("%Y%m%d-%H%M%S-%f"), "")
+    )
+    operations = []
+    for i, install in enumerate(installs):
+        backups = []
+        for replacedPath in install["replaced"]:
+            backupPath = os.path.join(
+                transactionPath, f"{i}-{os.path.basename(replacedPath)}"
+            )
+            link_or_copy(replacedPath, backupPath)
+            backups.append({"path": replacedPath, "backup": backupPath})
+        operations.append({"path": install["path"], "backups": backups})
+
+    journal = {"time": time.time(), "state": "committing", "operations": operations}
+    write_json_atomic(os.path.join(transactionPath, "transaction.json"), journal)
+
+    with measure("write") as record:
+        for install, operation in zip(installs, operations):
+            record["bytes"] += os.path.getsize(install["staged"])
+            os.replace(install["staged"], install["path"])
+            for backup in operation["backups"]:
+                if backup["path"] != install["path"]:
+                    os.remove(backup["path"])
+            invalidate_jars(install["path"], *install["replaced"])
+
+    journal["state"] = "committed"
+    write_json_atomic(os.path.join(transactionPath, "transaction.json"), journal)
+
+    print()
+    for install in installs:
+        if install["onInstall"]:
+            install["onInstall"]()
+        emit(
+            "install",
+            plugin=install["plugin"],
+            path=os.path.relpath(os.path.dirname(install["path"])),
+            source=install["source"],
+            file=os.path.relpath(install["path"]),
+            result="installed",
+        )
+
+    for stagingPath in {os.path.dirname(install["staged"]) for install in installs}:
+        remove_if_empty(stagingPath)
+    prune_backups()
+
+    return len(installs)
+
+
+def remove_if_empty(path):
+    try:
+        os.rmdir(path)
+    except OSError:
+        pass
+
+
+def get_transactions():
+    # Transaction folders, oldest first
+    backupsPath = get_cache_path("backups", "")
+    return [
+        os.path.join(backupsPath, name)
+        for name in sorted(os.listdir(backupsPath))
+        if os.path.exists(os.path.join(backupsPath, name, "transaction.json"))
+    ]
+
+
+def prune_backups():
+    # Only the last backupCount transactions can be rolled back
+    transactions = get_transactions()
+    for transactionPath in transactions[
+        : max(0, len(transactions) - settings.backupCount)
+    ]:
+        shutil.rmtree(transactionPath)
+
+
+def roll_back(transactionPath):
+    with open(os.path.join(transactionPath, "transaction.json")) as f:
+        journal = json.load(f)
+
+    for operation in reversed(journal["operations"]):
+        backupPaths = [backup["path"] for backup in operation["backups"]]
+        if operation["path"] not in backupPaths and os.path.exists(operation["path"]):
+            os.remove(operation["path"])
+
+        for backup in operation["backups"]:
+            # Restore into a temporary file first, so the jar is replaced atomically
+            tempPath = f"{backup['path']}.temp"
+            link_or_copy(backup["backup"], tempPath)
+            os.replace(tempPath, backup["path"])
+
+        invalidate_jars(operation["path"], *backupPaths)
+
+    journal["state"] = "rolledBack"
+    write_json_atomic(os.path.join(transactionPath, "transaction.json"), journal)
+    return journal
+
+
+def roll_back_last():
+    # Undoes the last install that hasn't been rolled back already
+    for transactionPath in reversed(get_transactions()):
+        with open(os.path.join(transactionPath, "transaction.json")) as f:
+            if json.load(f)["state"] != "rolledBack":
+                return roll_back(transactionPath)
+    return None
+
+
+def recover_installs(pluginsPaths):
+    # Rolls back an install that was interrupted, and removes leftover staged jars and
+    # backups of installs that never started
+    backupsPath = get_cache_path("backups", "")
+    for name in os.listdir(backupsPath):
+        if not os.path.exists(os.path.join(backupsPath, name, "transaction.json")):
+            shutil.rmtree(os.path.join(backupsPath, name))
+
+    for transactionPath in get_transactions():
+        with open(os.path.join(transactionPath, "transaction.json")) as f:
+            interrupted = json.load(f)["state"] == "committing"
+        if interrupted:
+            print("❕ The last install was interrupted, so it was rolled back.")
+            roll_back(transactionPath)
+
+    for pluginsPath in pluginsPaths:
+        stagingPath = os.path.join(pluginsPath, ".plugwatch-staging")
+        if os.path.exists(stagingPath):
+            shutil.rmtree(stagingPath)
@@ -0,0 +1,137 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from src.config import settings
+
+records = []
+recordsLock = threading.Lock()
+context = threading.local()
+
+sourceHosts = {
+    "api.spiget.org": "spigot",
+    "www.spigotmc.org": "spigot",
+    "dev.bukkit.org": "bukkit",
+    "api.github.com": "github",
+    "github.com": "github",
+    "objects.githubusercontent.com": "github",
+}
+
+
+@contextmanager
+def tagged(**tags):
+    # Tags every measurement made in this thread, e.g. with the plugin being processed
+    previousTags = {key: getattr(context, key, None) for key in tags}
+    for key, value in tags.items():
+        setattr(context, key, value)
+    try:
+        yield
+    finally:
+        for key, value in previousTags.items():
+            setattr(context, key, value)
+
+
+def get_source(url):
+    if getattr(context, "source", None):
+        return context.source
+    if not url:
+        return None
+
+    for source, baseUrl in (
+        ("spigot", settings.spigetApiUrl),
+        ("github", settings.githubApiUrl),
+        ("bukkit", settings.bukkitUrl),
+    ):
+        if url.startswith(baseUrl):
+            return source
+
+    host = urlparse(url).netloc
+    if host in sourceHosts:
+        return sourceHosts[host]
+    if "/job/" in url:
+        return "jenkins"
+    return "directUrls"
+
+
+@contextmanager
+def measure(kind, url=None):
+    # Records the wall time of the block. The block can fill in bytes and status.
+    record = {
+        "kind": kind,
+        "plugin": getattr(context, "plugin", None),
+        "source": get_source(url),
+        "host": urlparse(url).netloc if url else None,
+        "url": url,
+        "status": None,
+        "bytes": 0,
+    }
+    start = time.perf_counter()
+
+    try:
+        yield record
+    finally:
+        record["time"] = time.perf_counter() - start
+        with recordsLock:
+            records.append(record)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(key, kinds=None):
+    groups = {}
+    for record in records:
+        if kinds and record["kind"] not in kinds:
+            continue
+        groups.setdefault(record[key] or "(none)", []).append(record)
+
+    summary = [
+        {
+            key: name,
+            "count": len(group),
+            "time": sum(record["time"] for record in group),
+            "bytes": sum(record["bytes"] for record in group),
+            "p50": percentile([record["time"] for record in group], 0.5),
+            "p95": percentile([record["time"] for record in group], 0.95),
+        }
+        for name, group in groups.items()
+    ]
+    return sorted(summary, key=lambda row: row["time"], reverse=True)
+
+
+def get_profile():
+    return {
+        "kinds": summarize("kind"),
+        "plugins": summarize("plugin"),
+        "hosts": summarize("host", ("http", "download")),
+        "sources": summarize("source", ("http", "download")),
+        "records": records,
+    }
+
+
+def print_table(title, rows, key, limit=10):
+    print(f"\n📊 {title}")
+    print(f"   {key:<32} {'count':>6} {'total':>9} {'p50':>8} {'p95':>8} {'bytes':>12}")
+    for row in rows[:limit]:
+        print(
+            f"   {str(row[key])[:32]:<32} {row['count']:>6} {row['time']:>8.2f}s"
+            f" {row['p50']:>7.3f}s {row['p95']:>7.3f}s {row['bytes']:>12}"
+        )
+
+
+def print_profile():
+    profile = get_profile()
+
+    print_table("Time by operation", profile["kinds"], "kind")
+    print_table("Slowest plugins", profile["plugins"], "plugin")
+    print_table("Slowest hosts", profile["hosts"], "host")
+    print_table("Time by source", profile["sources"], "source")
+
+
+def write_profile(path):
+    with open(path, "w") as f:
+        json.dump(get_profile(), f, indent=4)
@@ -1,58 +1,127 @@
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-from src.config import settings
-from src.info import get_jar_info, get_json_info, get_latest_info
-from src.web import download_precedence
+from sty import fg
 
+from src.config import get_plugins_paths, settings
+from src.events import emit
+from src.info import (
+    get_jar_info,
+    get_json_info,
+    get_latest_info,
+    has_path_entry,
+    prefetch_github,
+    prefetch_spiget,
+)
+from src.install import commit_installs, discard_installs
+from src.metrics import tagged
+from src.utils import route_output, run_captured
+from src.web import RequestFailed, download_precedence
 
-def process_plugin(name):
-    jarInfo = get_jar_info(name=name, includeVersion=True, includePath=True)
 
-    if not jarInfo:
-        print(f"❕ I couldn't find {name} in the plugins path.")
+def process_plugins(names):
+    jobs = []
 
-    jsonInfo = get_json_info(name)
-
-    if not jsonInfo:
-        print(f"❌ I couldn't find {name} in plugins.json! Exiting.\n")
-        sys.exit()
+    for pluginsPath in get_plugins_paths():
+        jarInfoNames = {
+            jarInfo["name"].lower(): jarInfo
+            for jarInfo in reversed(
+                get_jar_info(
+                    pluginsPath=pluginsPath, includeVersion=True, includePath=True
+                )
+            )
+        }
 
-    print(f"🔍 Processing {name}...")
+        for name in names:
+            jsonInfo = get_json_info(name, pluginsPath)
 
-    if isinstance(jarInfo, dict):
-        currentVersion = jarInfo.get("version")
-        jarPath = jarInfo.get("jarPath")
+            if not jsonInfo:
+                print(f"❌ I couldn't find {name} in plugins.json! Exiting.\n")
+                sys.exit()
 
-        if isinstance(currentVersion, str):
-            print(f"   🟡 Current version is {currentVersion}")
-    else:
-        currentVersion = None
-        jarPath = None
+            jarInfo = jarInfoNames.get(jsonInfo["name"].lower(), {})
 
-    latestInfo = get_latest_info(jsonInfo, currentVersion)
+            if not jarInfo and not is_path_plugin(jsonInfo, jarInfo, pluginsPath):
+                print(f"❕ I couldn't find {name} in {pluginsPath}, skipping it.")
+                continue
+            if not jarInfo:
+                print(f"❕ I couldn't find {name} in {pluginsPath}.")
 
-    if not jsonInfo:
-        print(f"❗ I couldn't find any recent info for {name}!")
-        sys.exit()
+            jobs.append((jsonInfo, jarInfo, pluginsPath))
 
-    if settings.autoDownloads:
-        download_precedence(latestInfo, name, jarPath)
+    run_checks(jobs)
 
 
 def process_all_plugins():
-    jarInfoList = get_jar_info(includeVersion=True, includePath=True)
+    run_checks(collect_jobs())
+
+
+def collect_jobs(skipInvalid=False):
+    jobs = []
+
+    # Start fetching from SpigotMC and GitHub while jars are being read
+    executor = ThreadPoolExecutor(1)
+    prefetchFuture = executor.submit(
+        prefetch,
+        [
+            jsonInfo
+            for pluginsPath in get_plugins_paths()
+            for jsonInfo in get_json_info(pluginsPath=pluginsPath)
+        ],
+    )
+    try:
+        for pluginsPath in get_plugins_paths():
+            jobs += collect_path_jobs(pluginsPath, skipInvalid)
+    finally:
+        executor.shutdown()
+
+    print_prefetched(*prefetchFuture.result())
+    return jobs
+
+
+def collect_path_jobs(pluginsPath, skipInvalid=False):
+    if len(get_plugins_paths()) > 1:
+        print(f"\n🗄️ {pluginsPath}")
+
+    jarInfoList = get_jar_info(
+        pluginsPath=pluginsPath,
+        includeVersion=True,
+        includePath=True,
+        skipInvalid=skipInvalid,
+    )
 
     if not jarInfoList:
         print(f"❕ Your plugins path doesn't contain any plugins.\n")
 
-    jsonInfoList = get_json_info()
+    # Match jars to entries by name, ignoring case like the registry does
+    jarInfoNames = {
+        jarInfo["name"].lower(): jarInfo
+        for jarInfo in reversed(jarInfoList)
+        if jarInfo["name"]
+    }
+    jsonInfoList = get_json_info(pluginsPath=pluginsPath)
 
     if not jsonInfoList:
         print(f"❌ Your plugins.json file doesn't contain any entries! Exiting.\n")
         sys.exit()
 
+    jsonInfoList = [
+        jsonInfo
+        for jsonInfo in jsonInfoList
+        if is_path_plugin(
+            jsonInfo, jarInfoNames.get(jsonInfo["name"].lower()), pluginsPath
+        )
+    ]
+
     print("📋 Found", len(jsonInfoList), "plugin(s) to process.")
+    emit(
+        "inventory",
+        path=pluginsPath,
+        jars=len(jarInfoList),
+        plugins=len(jsonInfoList),
+    )
 
     if len(jarInfoList) > len(jsonInfoList):
         diff = len(jarInfoList) - len(jsonInfoList)
@@ -67,26 +136,177 @@ def process_all_plugins():
         else:
             print("❕ One plugins.json entry does not exist in your plugins path.")
 
-    for jsonInfo in jsonInfoList:
-        print("\n🔍 Processing", jsonInfo["name"] + "...")
+    return [
+        (jsonInfo, jarInfoNames.get(jsonInfo["name"].lower(), {}), pluginsPath)
+        for jsonInfo in jsonInfoList
+    ]
 
-        try:
-            jarInfo = [
-                plugin for plugin in jarInfoList if plugin["name"] == jsonInfo["name"]
-            ][0]
 
+def is_path_plugin(jsonInfo, jarInfo, pluginsPath):
+    # With several plugins paths, a path only gets the plugins it has a jar of, or that
+    # its own plugins.json lists, so other servers' plugins aren't installed into it
+    return (
+        bool(jarInfo)
+        or len(get_plugins_paths()) == 1
+        or has_path_entry(jsonInfo["name"], pluginsPath)
+    )
+
+
+def prefetch(jsonInfoList):
+    return prefetch_spiget(jsonInfoList), prefetch_github(jsonInfoList)
+
+
+def print_prefetched(spigotCount, githubCount):
+    if spigotCount:
+        print(f"📡 Fetched {spigotCount} SpigotMC resource(s)")
+    if githubCount:
+        print(f"📡 Fetched releases of {githubCount} GitHub repositories")
+
+
+def run_checks(jobs, stopOnError=True):
+    # Returns the exception raised by each job's check (or None) if not stopping on
+    # errors. Resources that weren't fetched yet are fetched first.
+    print_prefetched(*prefetch([job[0] for job in jobs]))
+
+    exceptions = []
+
+    try:
+        if settings.workers > 1:
+            # Check plugins concurrently, but print each plugin's output as a whole
+            # and in plugins.json order
+            route_output()
+            checkExecutor = ThreadPoolExecutor(settings.workers)
+            # Queued downloads wait for their turn in the download pool, so they can
+            # start smallest first
+            downloadExecutor = ThreadPoolExecutor(settings.downloadWorkers * 2)
+            # Checks wait for a free slot before queueing a download, so checks only
+            # run so far ahead of downloads
+            downloadSlots = threading.BoundedSemaphore(settings.downloadWorkers * 2)
+
+            def check_and_queue(*job):
+                latestInfo = get_plugin_info(*job)
+                if not settings.autoDownloads:
+                    return None
+
+                downloadSlots.acquire()
+                try:
+                    future = downloadExecutor.submit(
+                        run_captured, update_plugin, *job, latestInfo
+                    )
+                except RuntimeError:
+                    # Downloads were cancelled after an error
+                    downloadSlots.release()
+                    raise
+                future.add_done_callback(lambda _: downloadSlots.release())
+                return future
+
+            try:
+                futures = [
+                    checkExecutor.submit(run_captured, check_and_queue, *job)
+                    for job in jobs
+                ]
+                for future in futures:
+                    output, downloadFuture, exception = future.result()
+                    print(output, end="")
+                    if downloadFuture:
+                        output, _, exception = downloadFuture.result()
+                        print(output, end="")
+
+                    if is_fatal(exception) and stopOnError:
+                        raise exception
+                    exceptions.append(exception)
+            finally:
+                # Cancel queued downloads first, so no check is left waiting for a slot
+                downloadExecutor.shutdown(wait=False, cancel_futures=True)
+                checkExecutor.shutdown(cancel_futures=True)
+                downloadExecutor.shutdown()
+        else:
+            for job in jobs:
+                try:
+                    check_plugin(*job)
+                    exceptions.append(None)
+                except (Exception, SystemExit) as exception:
+                    if is_fatal(exception) and stopOnError:
+                        raise
+                    exceptions.append(exception)
+    except BaseException:
+        # Nothing is installed unless every check finishes
+        discard_installs()
+        raise
+
+    commit_installs()
+
+    # Failed requests only fail their own plugin
+    failedNames = [
+        job[0]["name"]
+        for job, exception in zip(jobs, exceptions)
+        if isinstance(exception, RequestFailed)
+    ]
+    emit(
+        "summary",
+        plugins=len(dict.fromkeys(job[0]["name"] for job in jobs)),
+        failed=list(dict.fromkeys(failedNames)),
+    )
+    return exceptions
+
+
+def is_fatal(exception):
+    return exception is not None and not isinstance(exception, RequestFailed)
+
+
+def check_plugin(jsonInfo, jarInfo, pluginsPath):
+    latestInfo = get_plugin_info(jsonInfo, jarInfo, pluginsPath)
+
+    if settings.autoDownloads:
+        update_plugin(jsonInfo, jarInfo, pluginsPath, latestInfo)
+
+
+def get_plugin_info(jsonInfo, jarInfo, pluginsPath):
+    with tagged(plugin=jsonInfo["name"], path=pluginsPath):
+        if len(get_plugins_paths()) > 1:
+            print(f"\n🔍 Processing {jsonInfo['name']} in {pluginsPath}...")
+        else:
+            print("\n🔍 Processing", jsonInfo["name"] + "...")
+
+        if jarInfo:
             print(f"   🆚 Current version is", jarInfo["version"])
-        except IndexError:
-            jarInfo = {}
 
-        latestInfo = get_latest_info(jsonInfo, jarInfo.get("version"))
+        start = time.perf_counter()
+        try:
+            latestInfo = get_latest_info(jsonInfo, jarInfo.get("version"))
+        except RequestFailed as exception:
+            print(fg.red + f"   ❗ {exception}" + fg.rs)
+            emit("error", phase="check", error=str(exception))
+            raise
+
+        emit(
+            "check",
+            currentVersion=jarInfo.get("version"),
+            versions=latestInfo.get("versions", {}),
+            builds=(
+                {
+                    "stable": latestInfo["jenkins"].get("stableBuildNumber"),
+                    "successful": latestInfo["jenkins"].get("successfulBuildNumber"),
+                }
+                if "jenkins" in latestInfo
+                else None
+            ),
+            newer=latestInfo.get("moreRecentPrecedence", []),
+            timeTaken=round(time.perf_counter() - start, 3),
+        )
+        return latestInfo
+
 
-        if settings.autoDownloads:
+def update_plugin(jsonInfo, jarInfo, pluginsPath, latestInfo):
+    with tagged(plugin=jsonInfo["name"], path=pluginsPath):
+        try:
             download_precedence(
                 latestInfo,
                 jsonInfo["name"],
                 jarInfo.get("jarPath"),
+                pluginsPath,
             )
-
-        # Apply delay
-        time.sleep(settings.delay)
+        except RequestFailed as exception:
+            print(fg.red + f"   ❗ {exception}" + fg.rs)
+            emit("error", phase="update", error=str(exception))
+            raise
@@ -1,5 +1,63 @@
+import hashlib
+import io
 import re
 import os
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+outputBuffers = threading.local()
+
+# Read once, since the umask can only be read by changing it
+umask = os.umask(0)
+os.umask(umask)
+
+# Descriptors of Bukkit, Paper and BungeeCord plugins, in order of preference
+pluginDescriptors = ("plugin.yml", "paper-plugin.yml", "bungee.yml")
+
+
+class ThreadOutput:
+    """Stand-in for sys.stdout that sends writes to the current thread's buffer, if any."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        buffer = getattr(outputBuffers, "buffer", None)
+        return (buffer or self.stream).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def route_output():
+    if not isinstance(sys.stdout, ThreadOutput):
+        sys.stdout = ThreadOutput(sys.stdout)
+
+
+@contextmanager
+def capture_output():
+    outputBuffers.buffer = io.StringIO()
+    try:
+        yield outputBuffers.buffer
+    finally:
+        outputBuffers.buffer = None
+
+
+def run_captured(function, *args):
+    # The exception is returned rather than raised so the caller can print the
+    # captured output first
+    with capture_output() as buffer:
+        try:
+            result = function(*args)
+        except BaseException as exception:
+            return buffer.getvalue(), None, exception
+    return buffer.getvalue(), result, None
 
 
 # From https://gist.github.com/tianchu/f7835b08d7c788b79ade
@@ -57,34 +115,151 @@ def get_filename(cd):
     return None
 
 
-# Derived from pluGET (https://github.com/Neocky/pluGET)
-def strip_version(version):
-    return re.sub(r"\.+", ".", re.sub(r"[^\d]", ".", version))
+# Release numbers, then qualifiers (e.g. "-rc.1"), then build metadata (e.g. "+build.5")
+versionPattern = re.compile(r"^\s*v?(\d+(?:\.\d+)*)?([^+]*)", flags=re.I)
+qualifierPattern = re.compile(r"\d+|[a-z]+")
+
+# Maven-style qualifier order. Unknown qualifiers sort with dev builds, and versions
+# without a qualifier are releases.
+qualifierRanks = {
+    "dev": 0,
+    "alpha": 1,
+    "a": 1,
+    "beta": 2,
+    "b": 2,
+    "milestone": 3,
+    "m": 3,
+    "pre": 4,
+    "preview": 4,
+    "rc": 4,
+    "cr": 4,
+    "snapshot": 5,
+    "ga": 6,
+    "final": 6,
+    "release": 6,
+    "sp": 7,
+}
+releaseQualifier = [(0, qualifierRanks["release"], "")]
 
 
-# Derived from pluGET (https://github.com/Neocky/pluGET)
-def get_version_tuple(version):
-    return tuple(map(int, (version.split("."))))
+@lru_cache(maxsize=4096)
+def parse_version(version):
+    # A sort key for a version, e.g. 1.2 < 1.2.1-rc2 < 1.2.1-SNAPSHOT < 1.2.1 = 1.2.1.0
+    match = versionPattern.match(version)
+    numbers = [int(number) for number in (match[1] or "").split(".") if number]
+    while numbers and numbers[-1] == 0:
+        numbers.pop()
+
+    qualifiers = [
+        (
+            (1, int(token), "")
+            if token.isdigit()
+            else (
+                0,
+                qualifierRanks.get(token, 0),
+                "" if token in qualifierRanks else token,
+            )
+        )
+        for token in qualifierPattern.findall(match[2].lower())
+    ]
+    return tuple(numbers), qualifiers or releaseQualifier
 
 
-# Derived from pluGET (https://github.com/Neocky/pluGET)
 def compare_versions(latestVersion, currentVersion):
-    try:
-        currentVersionTuple = get_version_tuple(strip_version(currentVersion))
-        latestVersionTuple = get_version_tuple(strip_version(latestVersion))
-    except ValueError:
-        return False
-
-    return latestVersionTuple > currentVersionTuple
-
-
-def write_plugin(content, path, *filesToDelete):
-    # Write to temporary file
-    with open(f"{path}.temp", "wb") as f:
-        f.write(content)
-    for fileToDelete in filesToDelete:
-        if fileToDelete:
-            os.remove(fileToDelete)
-    if path and os.path.exists(path):
-        os.remove(path)
-    os.rename(f"{path}.temp", path)
+    return parse_version(latestVersion) > parse_version(currentVersion)
+
+
+def rank_versions(versions, newerThan=None):
+    # Keys of a {key: version} dict, newest version first (ties keep their order),
+    # optionally only those newer than newerThan
+    keys = [
+        key
+        for key, version in versions.items()
+        if version and (not newerThan or compare_versions(version, newerThan))
+    ]
+    return sorted(keys, key=lambda key: parse_version(versions[key]), reverse=True)
+
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+# End of central directory record, and the longest comment that can follow it
+zipEndSignature = b"PK\x05\x06"
+zipTailSize = 22 + 65535
+
+
+class HashingFile:
+    """Wraps a file opened for writing and checks everything written to it."""
+
+    def __init__(self, file, algorithms=()):
+        self.file = file
+        self.algorithms = dict.fromkeys(("sha256", *algorithms))
+        self.restart()
+
+    def restart(self):
+        # Starts over from an empty file
+        self.file.seek(0)
+        self.file.truncate()
+        self.hashes = {
+            algorithm: hashlib.new(algorithm) for algorithm in self.algorithms
+        }
+        self.size = 0
+        # The end of the file, where a zip's central directory ends
+        self.tail = b""
+
+    def write(self, data):
+        for hash in self.hashes.values():
+            hash.update(data)
+        self.size += len(data)
+        self.tail = (self.tail + data)[-zipTailSize:]
+        return self.file.write(data)
+
+    def hexdigest(self):
+        return self.hashes["sha256"].hexdigest()
+
+    def get_problem(self, size=None, digests=None):
+        # Why what was written isn't the expected jar, if it isn't
+        if size is not None and self.size != size:
+            return f"got {self.size} of {size} bytes"
+        for algorithm, digest in (digests or {}).items():
+            if self.hashes[algorithm].hexdigest() != digest.lower():
+                return f"{algorithm.upper()} doesn't match"
+        if not has_zip_end(self.tail):
+            return "not a zip file, or cut short"
+        return None
+
+
+def has_zip_end(tail):
+    # The record has to be followed by exactly its comment
+    position = tail.rfind(zipEndSignature)
+    while position >= 0:
+        commentLength = int.from_bytes(tail[position + 20 : position + 22], "little")
+        if position + 22 + commentLength == len(tail):
+            return True
+        position = tail.rfind(zipEndSignature, 0, position)
+    return False
+
+
+def get_digests(digest):
+    # Digests given as "algorithm:hex", like GitHub's
+    if not digest or ":" not in digest:
+        return {}
+    algorithm, value = digest.split(":", 1)
+    if algorithm.lower() not in ("sha256", "sha1", "md5"):
+        return {}
+    return {algorithm.lower(): value}
+
+
+def make_temp_path(directory):
+    # Temporary files are made where they'll end up so they can be renamed into place
+    fd, tempPath = tempfile.mkstemp(suffix=".temp", dir=directory)
+    os.close(fd)
+    # mkstemp makes files only their owner can read, but servers may run as another
+    # user, so give them the permissions a new file would normally get
+    os.chmod(tempPath, 0o666 & ~umask)
+    return tempPath
@@ -1,88 +1,735 @@
+import heapq
+import itertools
 import json
+import math
+import os
+import random
 import re
-import zipfile
-from io import BytesIO
+import shutil
 import sys
+import tempfile
+import threading
+import time
+import zipfile
+from contextlib import contextmanager
+from urllib.parse import urlparse
 
-import requests
 from sty import fg
 
+from src.cache import (
+    get_cache_path,
+    get_download_record,
+    get_store_path,
+    is_installed,
+    is_stored,
+    load_cached_response,
+    record_download,
+    record_install,
+    refresh_cached_response,
+    restore_from_store,
+    store_cached_response,
+)
 from src.config import settings
-from src.utils import get_filename, reg_ex_jar, write_plugin
+from src.events import emit
+from src.install import get_staging_path, stage_install
+from src.metrics import measure, tagged
+from src.utils import (
+    HashingFile,
+    format_bytes,
+    get_filename,
+    make_temp_path,
+    reg_ex_jar,
+)
+
+githubHeaders = {}
+
+session = None
+sessionLock = threading.Lock()
+
+memoLock = threading.Lock()
+responseMemo = {}
+downloadMemo = {}
+
+hostSlots = {}
+hostSlotsLock = threading.Lock()
+
+downloadQueue = []
+downloadTickets = itertools.count()
+downloadCondition = threading.Condition()
+activeDownloads = 0
+
+bandwidth = {"until": 0.0}
+bandwidthLock = threading.Lock()
+
+
+class RequestFailed(Exception):
+    """A request that failed after retries, or to a host that was given up on."""
+
+
+def get_host_slot(url):
+    host = urlparse(url).netloc
+
+    with hostSlotsLock:
+        if host not in hostSlots:
+            hostSlots[host] = {
+                "semaphore": threading.BoundedSemaphore(settings.hostConnections),
+                "lock": threading.Lock(),
+                "lastRequest": 0.0,
+                "pausedUntil": 0.0,
+                "failures": 0,
+            }
+        return hostSlots[host]
+
+
+@contextmanager
+def host_slot(url):
+    # Limits in-flight requests per host and spaces them out by settings.delay
+    slot = get_host_slot(url)
+
+    # Hosts that keep failing are skipped for the rest of the run
+    if slot["failures"] >= settings.circuitBreakerFailures:
+        raise RequestFailed(f"{urlparse(url).netloc} is unreachable, skipping {url}")
+
+    with slot["semaphore"]:
+        # Wait out any rate limit the host has imposed
+        wait = slot["pausedUntil"] - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+
+        if settings.delay:
+            with slot["lock"]:
+                wait = slot["lastRequest"] + settings.delay - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                slot["lastRequest"] = time.monotonic()
+        yield
+
+
+def pause_host(url, seconds):
+    slot = get_host_slot(url)
+    slot["pausedUntil"] = max(slot["pausedUntil"], time.monotonic() + seconds)
+
+
+def record_host_result(url, ok):
+    # Counts consecutive failures (connection errors, timeouts and server errors)
+    slot = get_host_slot(url)
+    with slot["lock"]:
+        slot["failures"] = 0 if ok else slot["failures"] + 1
+
+
+def get_backoff(attempt):
+    # Exponential backoff with jitter, so retries from many threads don't line up
+    return 2**attempt * random.uniform(0.5, 1.0)
+
+
+def get_rate_limit_wait(response):
+    # How long the server asked us to wait, or None if this isn't a rate limit.
+    # GitHub answers 403 with X-RateLimit-Remaining: 0 when the limit is used up.
+    if response.status_code != 429 and not (
+        response.status_code == 403
+        and response.headers.get("X-RateLimit-Remaining") == "0"
+    ):
+        return None
+
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        pass
+    try:
+        return max(0.0, float(response.headers["X-RateLimit-Reset"]) - time.time())
+    except (KeyError, ValueError):
+        return 0.0
+
+
+def clear_memos(urls=None):
+    # Lets long-running processes see new responses and downloads. Hosts that were
+    # given up on are tried again. Given URLs, only the responses of those URLs (and
+    # the URLs below them) are forgotten.
+    with memoLock:
+        if urls is None:
+            responseMemo.clear()
+        else:
+            for url in list(responseMemo):
+                if any(url == u or url.startswith((u + "/", u + "?")) for u in urls):
+                    del responseMemo[url]
+        downloadMemo.clear()
+    with hostSlotsLock:
+        for slot in hostSlots.values():
+            slot["failures"] = 0
+
+
+def get_timeout(deadline=None):
+    # Connect and read timeouts, shortened so a request never runs past its deadline
+    if deadline is None:
+        return (settings.connectTimeout, settings.readTimeout)
+
+    remaining = max(0.1, deadline - time.monotonic())
+    return (
+        min(settings.connectTimeout, remaining),
+        min(settings.readTimeout, remaining),
+    )
+
+
+def send_request(method, url, **kwargs):
+    # Retries connection errors, timeouts and server errors with backoff, and waits out
+    # rate limits, all within settings.requestDeadline. Raises RequestFailed if the
+    # request can't be completed.
+    import requests
+
+    deadline = time.monotonic() + settings.requestDeadline
+    rateLimitAttempts = 0
+    attempt = 0
+
+    while True:
+        try:
+            with host_slot(url), measure("http", url) as record:
+                response = get_session().request(
+                    method, url, timeout=get_timeout(deadline), **kwargs
+                )
+                record["status"] = response.status_code
+                record["bytes"] = len(response.content)
+        except RequestFailed:
+            raise
+        except requests.exceptions.RequestException as exception:
+            record_host_result(url, False)
+            error = exception.__class__.__name__
+        else:
+            record_host_result(url, response.status_code < 500)
+            error = (
+                f"HTTP {response.status_code}" if response.status_code >= 500 else None
+            )
+
+        if not error:
+            wait = get_rate_limit_wait(response)
+            if wait is None:
+                return response
+
+            # Rate limited, so back off exponentially unless told how long to wait.
+            # Every request to the host waits, not just this one.
+            wait = wait or get_backoff(rateLimitAttempts)
+            rateLimitAttempts += 1
+            if (
+                rateLimitAttempts > settings.rateLimitRetries
+                or time.monotonic() + wait > deadline
+            ):
+                raise RequestFailed(
+                    f"Rate limited by {urlparse(url).netloc} (HTTP"
+                    f" {response.status_code}) for {url}"
+                )
+
+            print(
+                f"   ⏳ Rate limited by {urlparse(url).netloc}, retrying in {wait:.0f}s"
+            )
+            pause_host(url, wait)
+            continue
+
+        wait = get_backoff(attempt)
+        attempt += 1
+        if attempt > settings.requestRetries or time.monotonic() + wait > deadline:
+            raise RequestFailed(f"{error} from {url}")
+        time.sleep(wait)
+
+
+def get_session():
+    # One session is shared by every thread so connections are kept alive per host.
+    # Nothing modifies it after creation, apart from its (locked) cookie jar.
+    global session
+
+    # requests is only imported once something is fetched
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    with sessionLock:
+        if not session:
+            session = requests.Session()
+            session.headers.update({"User-Agent": settings.userAgent})
+
+            adapter = HTTPAdapter(
+                pool_connections=settings.poolConnections,
+                pool_maxsize=settings.poolMaxsize,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+
+    return session
 
 
 def request_api(url, headers=None):
+    # Each URL is only requested once per run, e.g. when plugins paths share plugins
+    with memoLock:
+        memo = responseMemo.setdefault(url, {"lock": threading.Lock()})
+
+    with memo["lock"]:
+        if "response" not in memo:
+            memo["response"] = fetch_api(url, headers)
+        return memo["response"]
+
+
+def fetch_api(url, headers=None):
+    headers = dict(headers or {})
+    cached = load_cached_response(url) if settings.httpCache else None
+
+    # Ask the server to only send the response if it changed
+    if cached:
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["lastModified"]:
+            headers["If-Modified-Since"] = cached["lastModified"]
+
+    response = send_request("GET", url, headers=headers)
+
+    if response.status_code == 304 and cached:
+        refresh_cached_response(cached)
+        return json.loads(cached["body"])
+    if settings.httpCache and response.ok:
+        store_cached_response(url, response)
+
     try:
-        if not headers:
-            headers = {"User-Agent": settings.userAgent}
+        return json.loads(response.content)
+    except ValueError:
+        raise RequestFailed(
+            f"Invalid response (HTTP {response.status_code}) from {url}"
+        )
+
 
-        return json.loads(requests.get(url, headers=headers).content)
-    except (TimeoutError, requests.exceptions.ConnectionError):
-        print(fg.red + f"   ❗ Failed to connect to {url}! Exiting." + fg.rs)
-        sys.exit()
+def get_github_headers():
+    # Built on first use, so importing this module doesn't load settings
+    if not githubHeaders:
+        headers = {"Accept": "application/vnd.github.v3+json"}
+        if settings.get("githubToken"):
+            headers["Authorization"] = f"token {settings.githubToken}"
+        githubHeaders.update(headers)
+    return githubHeaders
 
 
 def request_github_api(url):
-    if settings.githubToken:
-        headers = {
-            "Accept": "application/vnd.github.v3+json",
-            "Authorization": f"token {settings.githubToken}",
-        }
+    return request_api(url, get_github_headers())
 
-    return request_api(url, headers)
 
+def request_github_graphql(query):
+    url = f"{settings.githubApiUrl}/graphql"
+
+    response = send_request(
+        "POST", url, json={"query": query}, headers=get_github_headers()
+    )
 
-def download_file(url, headers):
     try:
-        return requests.get(url, headers=headers, allow_redirects=True)
-    except:
-        print(fg.red + "   ❗ Download failed! " + fg.rs)
+        return response.json()
+    except ValueError:
+        raise RequestFailed(
+            f"Invalid response (HTTP {response.status_code}) from {url}"
+        )
+
+
+def is_unchanged(response, record):
+    # Whether a response is the same file as a previous download
+    if response.status_code == 304:
+        return True
+    if not record:
+        return False
+    if response.headers.get("ETag"):
+        return response.headers["ETag"] == record["etag"]
+
+    lastModified = response.headers.get("Last-Modified")
+    contentLength = response.headers.get("Content-Length")
+    return (
+        lastModified
+        and contentLength
+        and (lastModified, contentLength)
+        == (record["lastModified"], record["contentLength"])
+    )
+
+
+def get_conditional_headers(record):
+    headers = {}
+
+    if record:
+        if record["etag"]:
+            headers["If-None-Match"] = record["etag"]
+        if record["lastModified"]:
+            headers["If-Modified-Since"] = record["lastModified"]
+
+    return headers
+
+
+def download_file(url, file, headers=None, record=None, digests=None):
+    # Streams the response into a HashingFile in chunks, so memory use doesn't grow
+    # with size, and checks it against the response's length and digests as it goes.
+    # If the file is the same as the download in record, the body isn't read at all.
+    # Transfers that are cut off are resumed where they stopped, if the server can.
+    import requests
+
+    measurement = {}
+    result = "failed"
+    problem = None
+    headers = dict(headers or {})
+    totalSize = None
+    showProgress = sys.stdout.isatty() and settings.workers == 1
+    attempt = 0
+
+    try:
+        with host_slot(url), measure("download", url) as measurement:
+            while True:
+                try:
+                    with get_session().get(
+                        url,
+                        headers=headers,
+                        allow_redirects=True,
+                        stream=True,
+                        timeout=get_timeout(),
+                    ) as response:
+                        measurement["status"] = response.status_code
+                        record_host_result(url, response.status_code < 500)
+                        if not file.size and is_unchanged(response, record):
+                            result = "unchanged"
+                            return response
+                        if response.status_code == 206:
+                            if get_range_start(response) != file.size:
+                                problem = "couldn't resume"
+                                return None
+                        elif not response.ok:
+                            problem = f"HTTP {response.status_code}"
+                            return None
+                        else:
+                            # The whole file is sent, even if part of it was already
+                            file.restart()
+                            totalSize = get_content_length(response)
+
+                        for chunk in response.iter_content(settings.chunkSize):
+                            throttle(len(chunk))
+                            file.write(chunk)
+                            measurement["bytes"] = file.size
+
+                            if showProgress:
+                                print(
+                                    f"\r   ⏳ {format_bytes(file.size)}"
+                                    + (
+                                        f" / {format_bytes(totalSize)}"
+                                        if totalSize
+                                        else ""
+                                    ),
+                                    end="",
+                                    flush=True,
+                                )
+                    break
+                except (
+                    requests.exceptions.ConnectionError,
+                    requests.exceptions.ChunkedEncodingError,
+                ):
+                    # Only the rest of the same file is asked for
+                    validator = file.size and (
+                        response.headers.get("ETag")
+                        or response.headers.get("Last-Modified")
+                    )
+                    if not validator or attempt == settings.requestRetries:
+                        raise
+                    attempt += 1
+                    headers.pop("If-None-Match", None)
+                    headers.pop("If-Modified-Since", None)
+                    headers["Range"] = f"bytes={file.size}-"
+                    headers["If-Range"] = validator
+
+                    if showProgress:
+                        print("\r", end="")
+                    print(f"   ⏳ Download was cut off at {format_bytes(file.size)}")
+                    time.sleep(get_backoff(attempt - 1))
+
+            problem = file.get_problem(totalSize, digests)
+        if problem:
+            result = "rejected"
+            return None
+        result = "downloaded"
+    except RequestFailed as exception:
+        problem = str(exception)
         return None
+    except requests.exceptions.RequestException:
+        record_host_result(url, False)
+        return None
+    finally:
+        # The result is shown in place of the progress
+        if showProgress:
+            print("\r", end="")
+        emit(
+            "download",
+            url=url,
+            result=result,
+            status=measurement.get("status"),
+            bytes=measurement.get("bytes", 0),
+            timeTaken=round(measurement.get("time", 0), 3),
+            error=problem,
+        )
+
+    return response
+
+
+def get_content_length(response):
+    # Decoded bodies don't match the length of the encoded one
+    if response.headers.get("Content-Encoding", "identity") != "identity":
+        return None
+    try:
+        return int(response.headers["Content-Length"])
+    except (KeyError, ValueError):
+        return None
+
+
+def get_range_start(response):
+    match = re.match(r"bytes (\d+)-", response.headers.get("Content-Range", ""))
+    return int(match[1]) if match else None
+
+
+def get_download_size(url, record=None, headers=None):
+    # Size of the last download from url, or what a HEAD request says, if anything
+    if record and record.get("contentLength"):
+        return int(record["contentLength"])
+
+    try:
+        response = send_request("HEAD", url, headers=headers, allow_redirects=True)
+    except RequestFailed:
+        return None
+    return get_content_length(response) if response.ok else None
+
+
+def has_free_space(size, *paths):
+    # Downloads need room on every filesystem they're written to, with minFreeSpace
+    # (in megabytes) to spare
+    devices = {os.stat(path).st_dev: path for path in paths}
+    for path in devices.values():
+        if shutil.disk_usage(path).free - (size or 0) < settings.minFreeSpace * 2**20:
+            print(fg.red + f"   ❗ Not enough free space in {path}!" + fg.rs)
+            return False
+    return True
+
+
+@contextmanager
+def download_turn(size):
+    # Waiting downloads start smallest first (unknown sizes last), downloadWorkers at
+    # a time, so small jars aren't stuck behind a large artifacts zip
+    global activeDownloads
+
+    ticket = (math.inf if size is None else size, next(downloadTickets))
+    with downloadCondition:
+        heapq.heappush(downloadQueue, ticket)
+        downloadCondition.wait_for(
+            lambda: downloadQueue[0] == ticket
+            and activeDownloads < settings.downloadWorkers
+        )
+        heapq.heappop(downloadQueue)
+        activeDownloads += 1
+        downloadCondition.notify_all()
+    try:
+        yield
+    finally:
+        with downloadCondition:
+            activeDownloads -= 1
+            downloadCondition.notify_all()
 
 
-def download_artifacts(url, regEx, regExInverse, jarPath, filename):
+def throttle(size):
+    # Spaces chunks out so all downloads together stay under downloadBandwidth
+    # (in KB/s). Reading slower makes the server send slower.
+    if not settings.downloadBandwidth:
+        return
+
+    with bandwidthLock:
+        now = time.monotonic()
+        bandwidth["until"] = max(bandwidth["until"], now) + size / (
+            settings.downloadBandwidth * 1024
+        )
+        wait = bandwidth["until"] - now
+    time.sleep(wait)
+
+
+def fetch_once(key, fetch, *args):
+    # Each file is fetched at most once per run, however many plugins paths need it
+    with memoLock:
+        memo = downloadMemo.setdefault(key, {"lock": threading.Lock()})
+
+    with memo["lock"]:
+        if "record" not in memo:
+            memo["record"] = fetch(*args)
+        return memo["record"]
+
+
+def fetch_artifacts(url, key, regEx, regExInverse, pluginsPath, digests, size):
+    # Artifact URLs are unique per artifact, so a stored one is never downloaded twice
+    record = get_download_record(key)
+    if is_stored(record):
+        return record
+
     print("   ❕ Downloading and extracting GitHub artifacts")
 
-    headers = {
-        "Accept": "application/vnd.github.v3+json",
-        "Authorization": f"token {settings.githubToken}",
-    }
-    zipFile = BytesIO(download_file(url, headers).content)
+    if size is None:
+        size = get_download_size(url, headers=get_github_headers())
+    if not has_free_space(
+        size, pluginsPath, get_cache_path("downloads", ""), tempfile.gettempdir()
+    ):
+        return None
+
+    # Spool the zip to disk, then extract only the selected jar
+    with tempfile.TemporaryFile() as zipFile, download_turn(size):
+        artifactsFile = download_file(
+            url,
+            HashingFile(zipFile, digests or ()),
+            get_github_headers(),
+            None,
+            digests,
+        )
+        if not artifactsFile:
+            return None
 
-    if zipFile:
         with zipfile.ZipFile(zipFile, "r") as artifactsZip:
             zipMember = reg_ex_jar(artifactsZip.namelist(), regEx, regExInverse)
-            artifact = artifactsZip.open(zipMember, "r")
 
-            if not filename:
-                filename = zipMember
-            write_plugin(artifact.read(), f"{settings.pluginsPath}/{filename}", jarPath)
+            tempPath = make_temp_path(get_cache_path("downloads", ""))
+            with artifactsZip.open(zipMember, "r") as artifact:
+                with open(tempPath, "wb") as f:
+                    hashingFile = HashingFile(f)
+                    shutil.copyfileobj(artifact, hashingFile, settings.chunkSize)
 
-            print(
-                f"{fg.green}   ⬇️ Extracted to"
-                f" {settings.pluginsPath}/{zipMember}{fg.rs}"
-            )
+    problem = hashingFile.get_problem()
+    if problem:
+        os.remove(tempPath)
+        print(fg.red + f"   ❗ {zipMember} is broken! ({problem})" + fg.rs)
+        return None
+
+    return record_download(
+        key,
+        artifactsFile,
+        hashingFile.hexdigest(),
+        tempPath,
+        filename=os.path.basename(zipMember),
+    )
 
 
-def download_plugin(url, jarPath, filename):
+def fetch_plugin(url, pluginsPath, build=None, digests=None):
+    record = get_download_record(url)
+    storedRecord = record if is_stored(record) else None
+
+    # Jenkins builds are identified by their number, so there's nothing to fetch
+    if build and storedRecord and storedRecord["build"] == build:
+        emit("download", url=url, result="unchanged", build=build)
+        return storedRecord
+
     print(f"   ⬇️ Downloading {url}")
 
-    headers = {"User-agent": settings.userAgent}
-    pluginFile = download_file(url, headers)
+    # Only ask for unchanged files to be skipped if they can be restored from the store
+    size = get_download_size(url, storedRecord)
+    if not has_free_space(size, pluginsPath, get_cache_path("downloads", "")):
+        return None
 
-    if pluginFile:
-        # Custom filename > filename from content-disposition > filename from URL
-        if not filename:
-            filename = get_filename(pluginFile.headers.get("content-disposition"))
-        if not filename:
-            filename = url.rsplit("/", 1)[1]
+    tempPath = make_temp_path(get_cache_path("downloads", ""))
+    with open(tempPath, "wb") as f, download_turn(size):
+        hashingFile = HashingFile(f, digests or ())
+        pluginFile = download_file(
+            url,
+            hashingFile,
+            get_conditional_headers(storedRecord),
+            storedRecord,
+            digests,
+        )
 
-        write_plugin(pluginFile.content, f"{settings.pluginsPath}/{filename}", jarPath)
+    if not pluginFile:
+        os.remove(tempPath)
+        return None
 
-        print(f"{fg.green}   ⬇️ Saved to {settings.pluginsPath}/{filename}{fg.rs}")
+    if is_unchanged(pluginFile, storedRecord):
+        os.remove(tempPath)
+        return record_download(
+            url,
+            pluginFile,
+            storedRecord["sha256"],
+            None,
+            build,
+            storedRecord["filename"],
+        )
 
+    # Filename from content-disposition > filename from URL
+    filename = get_filename(pluginFile.headers.get("content-disposition"))
+    if not filename:
+        filename = url.rsplit("/", 1)[1]
 
-def download_precedence(info, name, jarPath=None):
+    return record_download(
+        url, pluginFile, hashingFile.hexdigest(), tempPath, build, filename
+    )
+
+
+def install_download(key, record, jarPath, filename, pluginsPath):
+    # Custom filename > filename of the download
+    path = f"{pluginsPath}/{filename or record['filename']}"
+
+    if is_installed(record, pluginsPath, jarPath):
+        emit("install", file=path, result="unchanged", sha256=record["sha256"])
+        return
+
+    # Jars are linked from the store, but copied if it's on another filesystem, and
+    # the download may have been space-checked against another plugins path
+    storePath = get_store_path(record["sha256"])
+    if (
+        os.path.exists(storePath)
+        and os.stat(storePath).st_dev != os.stat(pluginsPath).st_dev
+        and not has_free_space(os.path.getsize(storePath), pluginsPath)
+    ):
+        emit(
+            "install",
+            file=path,
+            result="failed",
+            sha256=record["sha256"],
+            error="not enough free space",
+        )
+        return
+
+    tempPath = make_temp_path(get_staging_path(pluginsPath))
+    if not restore_from_store(record["sha256"], tempPath):
+        os.remove(tempPath)
+        emit(
+            "install",
+            file=path,
+            result="failed",
+            sha256=record["sha256"],
+            error="the download isn't in the store",
+        )
+        return
+
+    # Installed together with every other update once all plugins are checked
+    if not stage_install(
+        tempPath,
+        path,
+        jarPath,
+        onInstall=lambda: record_install(key, pluginsPath, path),
+    ):
+        emit(
+            "install",
+            file=path,
+            result="failed",
+            sha256=record["sha256"],
+            error="the download isn't a valid plugin",
+        )
+        return
+
+    emit("install", file=path, result="staged", sha256=record["sha256"])
+
+
+def download_artifacts(
+    url, regEx, regExInverse, jarPath, filename, pluginsPath, digests=None, size=None
+):
+    # Several plugins can come from the same artifacts zip
+    key = f"{url}#{regEx}#{regExInverse}"
+    record = fetch_once(
+        key, fetch_artifacts, url, key, regEx, regExInverse, pluginsPath, digests, size
+    )
+
+    if record:
+        install_download(key, record, jarPath, filename, pluginsPath)
+
+
+def download_plugin(url, jarPath, filename, pluginsPath, build=None, digests=None):
+    record = fetch_once(url, fetch_plugin, url, pluginsPath, build, digests)
+
+    if record:
+        install_download(url, record, jarPath, filename, pluginsPath)
+
+
+def download_precedence(info, name, jarPath, pluginsPath):
     if settings.forceDownloads:
         precedence = settings.precedence
     else:
@@ -97,6 +744,8 @@ def download_precedence(info, name, jarPath=None):
     for repo in precedence:
         if repo in info:
             url = None
+            build = None
+            digests = None
             filename = info.get("filename")
 
             match repo:
@@ -129,38 +778,49 @@ def download_precedence(info, name, jarPath=None):
                 # GitHub
                 case "github":
                     # Actions
-                    if settings.githubToken and (
+                    if settings.get("githubToken") and (
                         ("artifactUrl" in info["github"] and settings.preferActions)
                         or all(
                             url not in info["github"]
                             for url in ("releaseUrl", "prereleaseUrl")
                         )
                     ):
-                        download_artifacts(
-                            info["github"]["artifactUrl"],
-                            info["github"].get("regEx", ".*"),
-                            info["github"].get("regExInverse", ".^"),
-                            jarPath,
-                            filename,
-                        )
+                        with tagged(source=repo):
+                            download_artifacts(
+                                info["github"]["artifactUrl"],
+                                info["github"].get("regEx", ".*"),
+                                info["github"].get("regExInverse", ".^"),
+                                jarPath,
+                                filename,
+                                pluginsPath,
+                                info["github"].get("artifactDigests"),
+                                info["github"].get("artifactSize"),
+                            )
                         break
                     # Releases
                     if (
                         "releaseUrl" in info["github"] and settings.preferStable
                     ) or "prereleaseUrl" not in info["github"]:
                         url = info["github"]["releaseUrl"]
+                        digests = info["github"].get("releaseDigests")
                     else:
                         url = info["github"]["prereleaseUrl"]
+                        digests = info["github"].get("prereleaseDigests")
                 # Jenkins
                 case "jenkins":
                     if (
                         "stableBuildUrl" in info["jenkins"] and settings.preferStable
                     ) or "successfulBuildUrl" not in info["jenkins"]:
                         url = info["jenkins"]["stableBuildUrl"]
+                        build = info["jenkins"].get("stableBuildNumber")
+                        digests = info["jenkins"].get("stableBuildDigests")
                     else:
                         url = info["jenkins"]["successfulBuildUrl"]
+                        build = info["jenkins"].get("successfulBuildNumber")
+                        digests = info["jenkins"].get("successfulBuildDigests")
 
             if url:
-                download_plugin(url, jarPath, filename)
+                with tagged(source=repo):
+                    download_plugin(url, jarPath, filename, pluginsPath, build, digests)
 
             break